@@ -452,18 +452,23 @@ def run_attentiveness_check(duration: int = SEQUENCE_DURATION,
         "raw_score": float,
         "base_scores": {...},
         "adjusted_scores": {...},
-        "emotion_confidence": float
+        "emotion_confidence": float,
+        "timings": {"model_load", "webcam_capture", "inference"}  # seconds
       }
     """
+    t0 = time.perf_counter()
     init_models()
+    t1 = time.perf_counter()
 
     # 1) capture frames
     frames = capture_frames_from_webcam(duration=duration, fps=fps)
+    t2 = time.perf_counter()
 
     # 2) predict
     score, classification, details = predict_attentiveness(
         _behavioral_model, _emotion_model, _face_cascade, frames, DEVICE
     )
+    t3 = time.perf_counter()
 
     # 3) build result dict with plain Python types
     result = {
@@ -478,6 +483,12 @@ def run_attentiveness_check(duration: int = SEQUENCE_DURATION,
             k: float(v) for k, v in details.get("adjusted_scores", {}).items()
         },
         "emotion_confidence": float(details.get("emotion_confidence", 0.0)),
+        # seconds per stage, picked up by the backend's /metrics
+        "timings": {
+            "model_load": t1 - t0,
+            "webcam_capture": t2 - t1,
+            "inference": t3 - t2,
+        },
     }
     return result
 
@@ -1,94 +1,377 @@
 # ai_core.py
 import os
-import re
 import json
-import random
 import hashlib
-from typing import List, Optional
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import uuid
+import time
+import threading
+import asyncio
+import queue
+from typing import AsyncIterator, Callable, Iterator, List, Optional, Tuple
 from dotenv import load_dotenv
+import numpy as np
 
 # Chroma + embeddings
 from langchain_community.vectorstores import Chroma
 from langchain_community.embeddings import HuggingFaceEmbeddings
 
-# Groq SDK
-from groq import Groq
+import metrics
+from caching import LRUCache
+from llm_cache import LLMCache, prompt_fingerprint
+from singleflight import SingleFlight
+from llm_provider import LLMResponse, make_provider
+from rate_limiter import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PRIORITY_NORMAL, RateLimiter
+from retry_policy import CircuitBreaker, CircuitOpenError, RetryDecision, RetryPolicy
+from embedding_cache import EmbeddingCache
+from vector_index import DOC_PAGE_SIZE, ChromaBackend, NumpyVectorIndex
+from pdf_pipeline import PdfChunkStream, clean_text, default_workers
+from quiz_planner import partition
+from question_bank import QuestionBank
+from mcq_parser import MCQ_JSON_SCHEMA, parse_mcqs, shuffle_options
 
 # --------- ENV + CLIENTS ----------
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-if not GROQ_API_KEY:
-    raise RuntimeError("Please set GROQ_API_KEY in ai-backend/.env (GROQ_API_KEY=...)")
 
-client = Groq(api_key=GROQ_API_KEY)
+# groq | record | replay | fake (see llm_provider); only groq/record need the key
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "groq").lower()
+LLM_RECORD_PATH = os.getenv("LLM_RECORD_PATH", "./llm_recording.jsonl")
+LLM_REPLAY_PATH = os.getenv("LLM_REPLAY_PATH", LLM_RECORD_PATH)
+LLM_FAKE_LATENCY = float(os.getenv("LLM_FAKE_LATENCY", "0.3"))                  # seconds to first token
+LLM_FAKE_TOKENS_PER_SEC = float(os.getenv("LLM_FAKE_TOKENS_PER_SEC", "500"))
+llm = make_provider(
+    LLM_PROVIDER,
+    api_key=GROQ_API_KEY,
+    record_path=LLM_RECORD_PATH,
+    replay_path=LLM_REPLAY_PATH,
+    latency=LLM_FAKE_LATENCY,
+    tokens_per_second=LLM_FAKE_TOKENS_PER_SEC,
+)
 
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+# --- RATE LIMIT PROTECTION ---
+# one limiter for every Groq call in the process; defaults match the
+# llama-3.1-8b-instant free tier and are corrected from response headers
+GROQ_RPM = float(os.getenv("GROQ_RPM", "30"))
+GROQ_TPM = float(os.getenv("GROQ_TPM", "6000"))
+groq_limiter = RateLimiter(GROQ_RPM, GROQ_TPM)
+
+# 429s wait out Retry-After, 5xx/network errors back off with jitter, other 4xx
+# fail at once; repeated provider failures open the breaker (see retry_policy)
+GROQ_MAX_ATTEMPTS = int(os.getenv("GROQ_MAX_ATTEMPTS", "4"))
+GROQ_RETRY_BASE_DELAY = float(os.getenv("GROQ_RETRY_BASE_DELAY", "0.5"))    # seconds
+GROQ_RETRY_MAX_DELAY = float(os.getenv("GROQ_RETRY_MAX_DELAY", "8"))
+GROQ_MAX_RETRY_AFTER = float(os.getenv("GROQ_MAX_RETRY_AFTER", "30"))     # longer 429 windows fail fast
+GROQ_BREAKER_FAILURES = int(os.getenv("GROQ_BREAKER_FAILURES", "5"))
+GROQ_BREAKER_RESET = float(os.getenv("GROQ_BREAKER_RESET", "30"))         # seconds open before a trial call
+retry_policy = RetryPolicy(GROQ_MAX_ATTEMPTS, GROQ_RETRY_BASE_DELAY, GROQ_RETRY_MAX_DELAY, GROQ_MAX_RETRY_AFTER)
+groq_breaker = CircuitBreaker(GROQ_BREAKER_FAILURES, GROQ_BREAKER_RESET)
+
+# opt-in (LLM_CACHE=1) on-disk cache of completions keyed by prompt fingerprint;
+# pass cache=False to a call to bypass it (and the in-flight sharing below)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "0").lower() in ("1", "true", "yes")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./llm_cache.sqlite3")
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+llm_cache = LLMCache(LLM_CACHE_PATH, LLM_CACHE_TTL, LLM_CACHE_MAX_ENTRIES) if LLM_CACHE_ENABLED else None
+
+# concurrent identical requests (same prompt fingerprint / retrieval key)
+# wait on the one already in flight instead of repeating it
+llm_flight = SingleFlight()
+retrieval_flight = SingleFlight()
+
+EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBED_DIM = 384
+embeddings = HuggingFaceEmbeddings(model_name=EMBED_MODEL)
 
 # NOTE: this expects ./chroma_db folder to exist beside this file
+CHROMA_DIR = os.getenv("CHROMA_DIR", "./chroma_db")
+CHROMA_COLLECTION = os.getenv("CHROMA_COLLECTION", "nsc")
+
 vector_store = Chroma(
-    collection_name="nsc",
+    collection_name=CHROMA_COLLECTION,
     embedding_function=embeddings,
-    persist_directory="./chroma_db"
+    persist_directory=CHROMA_DIR
 )
 
-
-# ai_core.py
-
-from langchain_community.document_loaders import PyPDFLoader
-import os
-
-# ... existing GROQ / embeddings / vector_store setup ...
-def clean_text(text: str) -> str:
-    # fix spaced characters like "J o i n"
-    text = re.sub(r'(\b\w\b\s)+\w\b', lambda m: m.group(0).replace(" ", ""), text)
-    
-    # remove extra spaces
-    text = re.sub(r'\s+', ' ', text)
-
-    return text.strip()
-
-def ingest_pdf(path: str) -> int:
+# "chroma" (default) or "numpy": in-process exact search over a matrix of
+# normalised embeddings, seeded from the Chroma collection the first time
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+NUMPY_INDEX_DIR = os.getenv("NUMPY_INDEX_DIR", "./numpy_index")
+NUMPY_INDEX_DTYPE = os.getenv("NUMPY_INDEX_DTYPE", "float32")  # or float16
+
+def _make_backend():
+    chroma = ChromaBackend(vector_store)
+    if VECTOR_BACKEND == "chroma":
+        return chroma
+    if VECTOR_BACKEND == "numpy":
+        index = NumpyVectorIndex(os.path.join(NUMPY_INDEX_DIR, CHROMA_COLLECTION), EMBED_DIM, dtype=NUMPY_INDEX_DTYPE)
+        if index.count() == 0 and chroma.count() > 0:
+            print("Building numpy index from Chroma:", index.import_from(chroma), "rows")
+        return index
+    raise RuntimeError(f"Unknown VECTOR_BACKEND: {VECTOR_BACKEND!r} (expected 'chroma' or 'numpy')")
+
+vector_backend = _make_backend()
+
+# vectors keyed by doc_hash, shared by every collection built with this model
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", "./embedding_cache")
+embedding_cache = EmbeddingCache(os.path.join(EMBED_CACHE_DIR, EMBED_MODEL.replace("/", "__")), EMBED_DIM)
+
+# normalised query text -> embedding, so repeated topics skip the forward pass
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "512"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))  # seconds
+query_embedding_cache = LRUCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+
+# (query, k, source, generation) -> top-k texts; every write to the collection
+# bumps the generation, so a cached result can never outlive the data it saw
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "256"))
+retrieval_cache = LRUCache(RETRIEVAL_CACHE_SIZE)
+_collection_generation = 0
+_generation_lock = threading.Lock()
+
+def bump_collection_generation() -> int:
+    """Call after anything is added to or deleted from the collection."""
+    global _collection_generation
+    with _generation_lock:
+        _collection_generation += 1
+        retrieval_cache.clear()
+        return _collection_generation
+
+
+INGEST_BATCH_SIZE = 256   # chunks embedded + inserted per round trip
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", default_workers()))  # extraction processes
+INGEST_MANIFEST = os.getenv("INGEST_MANIFEST", os.path.join(CHROMA_DIR, "ingest_manifest.json"))
+
+
+class IngestCancelled(Exception):
+    """Raised inside ingest_pdf when its cancel_event is set."""
+
+
+# serialises the final "still missing?" check + insert across concurrent ingests
+_ingest_lock = threading.Lock()
+
+
+def embed_chunks(hashes: List[str], texts: List[str]) -> List[List[float]]:
+    """Embed chunk texts, reading/writing the on-disk cache by doc_hash."""
+    cached = embedding_cache.get_many(hashes)
+    missing = [j for j, h in enumerate(hashes) if h not in cached]
+    if missing:
+        with metrics.timed("embedding"):
+            fresh = embeddings.embed_documents([texts[j] for j in missing])
+        embedding_cache.put_many([hashes[j] for j in missing], fresh)
+        for j, vec in zip(missing, fresh):
+            cached[hashes[j]] = vec
+    return [[float(x) for x in cached[h]] for h in hashes]
+
+def _delete_hashes(hashes: List[str]) -> None:
+    vector_backend.delete_hashes(hashes)
+    bump_collection_generation()
+
+
+# --------- INGEST MANIFEST ----------
+# abs path -> {"source", "size", "mtime", "content_hash", "chunk_hashes"}
+_manifest: Optional[dict] = None
+_manifest_lock = threading.Lock()
+
+def _load_manifest() -> dict:
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(INGEST_MANIFEST, "r", encoding="utf-8") as f:
+                _manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            _manifest = {}
+    return _manifest
+
+def _save_manifest() -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(INGEST_MANIFEST)), exist_ok=True)
+    tmp = INGEST_MANIFEST + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(_load_manifest(), f)
+    os.replace(tmp, INGEST_MANIFEST)
+
+def _file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def ingest_pdf(
+    path: str,
+    batch_size: int = INGEST_BATCH_SIZE,
+    progress: Optional[Callable[[dict], None]] = None,
+    cancel_event: Optional[threading.Event] = None,
+    force: bool = False,
+    workers: int = INGEST_WORKERS
+) -> int:
+    """
+    Add the new chunks of a PDF to the vector store; returns how many were added.
+
+    Pages are extracted and cleaned by `workers` processes (see pdf_pipeline)
+    while this thread embeds and inserts the chunks in batches as they arrive.
+
+    Files whose size/mtime (or, failing that, content hash) match the ingest
+    manifest are skipped without being parsed. For an edited file only chunks
+    not seen in its previous version are looked up and embedded, and chunks that
+    vanished from it are deleted unless another ingested file still has them.
+    `force` re-reads and re-checks the file even if the manifest says it is
+    unchanged; chunks its previous version had are still pruned.
+
+    `progress` is called with a stats dict (pages_total, pages_extracted,
+    chunks_total, chunks_embedded, chunks_skipped, chunks_deleted, eta_seconds)
+    after every batch. Setting `cancel_event` stops the ingest between batches
+    with IngestCancelled; batches already inserted stay in the store.
+    """
     if not os.path.exists(path):
         raise FileNotFoundError(f"PDF not found: {path}")
 
-    loader = PyPDFLoader(path)
-    docs = loader.load()
-    splitter = RecursiveCharacterTextSplitter(
-    chunk_size=500,
-    chunk_overlap=100
-    )
-
-    docs = splitter.split_documents(docs)
+    stats = {
+        "pages_total": 0,
+        "pages_extracted": 0,
+        "chunks_total": 0,
+        "chunks_embedded": 0,
+        "chunks_skipped": 0,
+        "chunks_deleted": 0,
+        "eta_seconds": None,
+    }
+
+    def report():
+        if progress:
+            progress(dict(stats))
+
+    def check_cancel():
+        if cancel_event is not None and cancel_event.is_set():
+            raise IngestCancelled(path)
+
+    key = os.path.abspath(path)
+    source = os.path.basename(path)
+    st = os.stat(path)
+    with _manifest_lock:
+        entry = _load_manifest().get(key)
+
+    if entry and not force and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime:
+        print("Unchanged since last ingest:", path)
+        stats["chunks_total"] = stats["chunks_skipped"] = len(entry["chunk_hashes"])
+        stats["eta_seconds"] = 0
+        report()
+        return 0
+
+    content_hash = _file_hash(path)
+    if entry and not force and entry["content_hash"] == content_hash:
+        # touched but not edited
+        with _manifest_lock:
+            entry.update(size=st.st_size, mtime=st.st_mtime)
+            _save_manifest()
+        stats["chunks_total"] = stats["chunks_skipped"] = len(entry["chunk_hashes"])
+        stats["eta_seconds"] = 0
+        report()
+        return 0
+
+    previous = set(entry["chunk_hashes"]) if entry else set()
+    # forced: don't trust the manifest's claim that these are still stored
+    assumed_stored = set() if force else previous
     added_count = 0
-    print("Loaded pages:", len(docs))
-    for i, d in enumerate(docs):
-        
-        text = clean_text(d.page_content)
-        if not text:
-            continue
-        print(f"Adding chunk {i}, length:", len(text))
-        doc_hash = hash_text(text)
-
-        # If hash exists → skip
-        search = vector_store._collection.get(
-            where={"doc_hash": doc_hash},
-            include=["metadatas"]
-        )
-        if search and search.get("metadatas"):
-            continue
-
-        vector_store.add_texts(
-            texts=[text],
-            metadatas=[{
-                "source": os.path.basename(path),
-                "page": i,
-                "doc_hash": doc_hash
-            }],
-        )
-        added_count += 1
-
-    vector_store.persist()
+    started = time.monotonic()
+
+    # the same chunk twice in one file is stored once
+    seen = set()
+    chunk_hashes: List[str] = []
+
+    def flush(batch):
+        nonlocal added_count
+        # chunks from the previous version of this file are already stored
+        stored = vector_backend.existing_hashes([h for _, _, h in batch if h not in assumed_stored])
+        todo = [c for c in batch if c[2] not in assumed_stored and c[2] not in stored]
+        if todo:
+            vectors = embed_chunks([h for _, _, h in todo], [text for _, text, _ in todo])
+            with _ingest_lock:
+                # another ingest may have stored some of these while we were encoding
+                stored = vector_backend.existing_hashes([h for _, _, h in todo])
+                keep = [j for j, c in enumerate(todo) if c[2] not in stored]
+                if keep:
+                    with metrics.timed("vector_insert"):
+                        vector_backend.add(
+                            ids=[str(uuid.uuid4()) for _ in keep],
+                            vectors=[vectors[j] for j in keep],
+                            texts=[todo[j][1] for j in keep],
+                            metadatas=[{
+                                "source": source,
+                                "page": todo[j][0],
+                                "doc_hash": todo[j][2]
+                            } for j in keep],
+                        )
+                    bump_collection_generation()
+            added_count += len(keep)
+            stats["chunks_embedded"] += len(keep)
+        else:
+            keep = []
+        stats["chunks_skipped"] += len(batch) - len(keep)
+
+    stream = PdfChunkStream(path, workers=workers)
+    stats["pages_total"] = stream.num_pages
+    print("Loaded pages:", stream.num_pages, "extraction workers:", stream.workers)
+    try:
+        batch = []
+        for i, text in stream:
+            if not text:
+                continue
+            doc_hash = hash_text(text)
+            if doc_hash in seen:
+                continue
+            seen.add(doc_hash)
+            chunk_hashes.append(doc_hash)
+            batch.append((i, text, doc_hash))
+            if len(batch) < batch_size:
+                continue
+
+            check_cancel()
+            flush(batch)
+            batch = []
+            stats["pages_extracted"] = stream.pages_done
+            stats["chunks_total"] = len(chunk_hashes)
+            rate = max(stream.pages_done, 1) / max(time.monotonic() - started, 1e-6)
+            stats["eta_seconds"] = round((stream.num_pages - stream.pages_done) / rate, 1)
+            report()
+
+        check_cancel()
+        if batch:
+            flush(batch)
+    finally:
+        stream.close()
+
+    stats["pages_extracted"] = stream.num_pages
+    stats["chunks_total"] = len(chunk_hashes)
+    print(f"New chunks: {stats['chunks_embedded']}, already stored: {stats['chunks_skipped']}")
+
+    with _manifest_lock:
+        manifest = _load_manifest()
+        still_used = set()
+        for other_key, other in manifest.items():
+            if other_key != key:
+                still_used.update(other["chunk_hashes"])
+        gone = sorted(previous - seen - still_used)
+        if gone:
+            _delete_hashes(gone)
+            stats["chunks_deleted"] = len(gone)
+            print("Deleted stale chunks:", len(gone))
+
+        manifest[key] = {
+            "source": source,
+            "size": st.st_size,
+            "mtime": st.st_mtime,
+            "content_hash": content_hash,
+            "chunk_hashes": chunk_hashes,
+        }
+        _save_manifest()
+
+    vector_backend.persist()
+    stats["eta_seconds"] = 0
+    report()
+    if added_count:
+        # new chunks to write questions for; a no-op re-ingest doesn't queue LLM work
+        schedule_bank_fill(source)
+    elif stats["chunks_deleted"] and question_bank is not None:
+        question_bank.prune(source, set(chunk_hashes))
     return added_count
 
 
@@ -97,107 +380,394 @@ def ingest_pdf(path: str) -> int:
 def hash_text(s: str) -> str:
     return hashlib.sha256(s.encode("utf-8")).hexdigest()
 
+def _with_context(messages: List[dict], context: Optional[str]) -> List[dict]:
+    if not context:
+        return messages
+    context_msg = {
+        "role": "system",
+        "content": (
+            "ONLY use the provided CONTEXT to answer the user's requests. "
+            "If the answer is not in the context, say: \"I can't find that in your notes.\" "
+            "CONTEXT START:\n\n" + context + "\n\nCONTEXT END"
+        )
+    }
+    return [context_msg] + messages
+
+def _estimate_tokens(messages: List[dict], max_completion_tokens: int) -> int:
+    # ~4 chars per token for the prompt, plus the full completion allowance
+    return sum(len(m.get("content") or "") for m in messages) // 4 + max_completion_tokens
+
+def _fingerprint(model: str, messages: List[dict], max_completion_tokens: int, temperature: float,
+                 response_format: Optional[dict] = None) -> str:
+    params = {"response_format": response_format} if response_format else {}
+    return prompt_fingerprint(model, messages, max_completion_tokens=max_completion_tokens,
+                              temperature=temperature, **params)
+
+def _cache_response(key: Optional[str], model: str, content: Optional[str]) -> None:
+    if key and content and not content.startswith("ERROR_IN_GROQ"):
+        llm_cache.set(key, content, model)
+
+def _on_response(resp: LLMResponse, model: str, estimate: int, key: Optional[str]) -> None:
+    groq_breaker.record(provider_failure=False)
+    groq_limiter.update_from_headers(resp.headers)
+    groq_limiter.record_usage(estimate, resp.total_tokens)
+    metrics.record_tokens(model, resp.prompt_tokens, resp.completion_tokens, resp.total_tokens)
+    metrics.llm_outcome("ok", model)
+    _cache_response(key, model, resp.content)
+
+def _on_error(e: Exception, model: str, attempt: int, retries: int, delay: float,
+              can_retry: bool = True) -> RetryDecision:
+    """Classify a failed call, feed the limiter/breaker and say whether to retry."""
+    if isinstance(e, CircuitOpenError):
+        metrics.llm_outcome("circuit_open", model)
+        return RetryDecision(False, reason="circuit_open")
+
+    decision = retry_policy.decide(e, attempt, retries, delay)
+    if not can_retry:
+        decision.retry = False
+    response = getattr(e, "response", None)
+    groq_limiter.update_from_headers(getattr(response, "headers", None))
+    if decision.retry_after:
+        # hold every other caller too, not just this retry; never for longer than any
+        # caller would wait itself (a longer window makes this call give up instead)
+        groq_limiter.pause(min(decision.retry_after, retry_policy.max_retry_after))
+    groq_breaker.record(decision.provider_failure)
+    metrics.llm_outcome("retry" if decision.retry else "error", model)
+    action = f"retrying in {decision.delay:.1f}s" if decision.retry else "giving up"
+    print(f"Groq call failed ({decision.reason}), attempt {attempt + 1}/{retries}, {action}")
+    return decision
+
 def _safe_groq_call(
     messages: List[dict],
     model: str = "llama-3.1-8b-instant",
     context: Optional[str] = None,
     max_completion_tokens: int = 1024,
     temperature: float = 0.2,
-    retries: int = 4,
-    delay: float = 2.0
+    retries: int = GROQ_MAX_ATTEMPTS,
+    delay: float = GROQ_RETRY_BASE_DELAY,
+    priority: int = PRIORITY_NORMAL,
+    cache: bool = True,
+    response_format: Optional[dict] = None
 ) -> str:
+    messages = _with_context(messages, context)
+    fingerprint = _fingerprint(model, messages, max_completion_tokens, temperature, response_format)
+    key = fingerprint if llm_cache is not None and cache else None
+    if key:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            metrics.llm_outcome("cached", model)
+            return cached
+
+    request = lambda: _groq_request(
+        messages, model, max_completion_tokens, temperature, retries, delay, priority, key, response_format)
+    if not cache:
+        # the caller wants a fresh completion, not one shared with an identical prompt
+        return request()
+    # an identical prompt already in flight is shared rather than sent again
+    return llm_flight.do(fingerprint, request)
+
+def _groq_request(messages, model, max_completion_tokens, temperature, retries, delay, priority, key,
+                  response_format=None) -> str:
+    estimate = _estimate_tokens(messages, max_completion_tokens)
     for attempt in range(retries):
         try:
-            if context:
-                context_msg = {
-                    "role": "system",
-                    "content": (
-                        "ONLY use the provided CONTEXT to answer the user's requests. "
-                        "If the answer is not in the context, say: \"I can't find that in your notes.\" "
-                        "CONTEXT START:\n\n" + context + "\n\nCONTEXT END"
-                    )
-                }
-                messages = [context_msg] + messages
-
-            completion = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                max_completion_tokens=max_completion_tokens,
-                temperature=temperature,
-            )
-
-            return completion.choices[0].message.content
-        
+            groq_breaker.before_call()
+            metrics.observe_stage("rate_limit_wait", groq_limiter.acquire(estimate, priority))
+            with metrics.timed("llm_call"):
+                resp = llm.complete(model, messages, max_completion_tokens, temperature, response_format)
+            _on_response(resp, model, estimate, key)
+            return resp.content
+
         except Exception as e:
-            if attempt == retries - 1:
+            decision = _on_error(e, model, attempt, retries, delay)
+            if not decision.retry:
                 return f"ERROR_IN_GROQ: {str(e)}"
-            time.sleep(delay)  
-# --- RATE LIMIT PROTECTION ---
-import time
-GROQ_API_DELAY = 1.2  # seconds between Groq API calls
+            time.sleep(decision.delay)
+
+async def _async_safe_groq_call(
+    messages: List[dict],
+    model: str = "llama-3.1-8b-instant",
+    context: Optional[str] = None,
+    max_completion_tokens: int = 1024,
+    temperature: float = 0.2,
+    retries: int = GROQ_MAX_ATTEMPTS,
+    delay: float = GROQ_RETRY_BASE_DELAY,
+    priority: int = PRIORITY_NORMAL,
+    cache: bool = True,
+    response_format: Optional[dict] = None
+) -> str:
+    """asyncio twin of _safe_groq_call: same limiter, no thread held while waiting."""
+    messages = _with_context(messages, context)
+    fingerprint = _fingerprint(model, messages, max_completion_tokens, temperature, response_format)
+    key = fingerprint if llm_cache is not None and cache else None
+    if key:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            metrics.llm_outcome("cached", model)
+            return cached
+
+    request = lambda: _agroq_request(
+        messages, model, max_completion_tokens, temperature, retries, delay, priority, key, response_format)
+    if not cache:
+        return await request()
+    return await llm_flight.ado(fingerprint, request)
+
+async def _agroq_request(messages, model, max_completion_tokens, temperature, retries, delay, priority, key,
+                         response_format=None) -> str:
+    estimate = _estimate_tokens(messages, max_completion_tokens)
+    for attempt in range(retries):
+        try:
+            groq_breaker.before_call()
+            metrics.observe_stage("rate_limit_wait", await groq_limiter.acquire_async(estimate, priority))
+            with metrics.timed("llm_call"):
+                resp = await llm.acomplete(model, messages, max_completion_tokens, temperature, response_format)
+            _on_response(resp, model, estimate, key)
+            return resp.content
+
+        except Exception as e:
+            decision = _on_error(e, model, attempt, retries, delay)
+            if not decision.retry:
+                return f"ERROR_IN_GROQ: {str(e)}"
+            await asyncio.sleep(decision.delay)
+
+async def _async_stream_groq_call(
+    messages: List[dict],
+    model: str = "llama-3.1-8b-instant",
+    context: Optional[str] = None,
+    max_completion_tokens: int = 1024,
+    temperature: float = 0.2,
+    retries: int = GROQ_MAX_ATTEMPTS,
+    delay: float = GROQ_RETRY_BASE_DELAY,
+    priority: int = PRIORITY_NORMAL,
+    cache: bool = True
+) -> AsyncIterator[str]:
+    """
+    Streaming flavour of _async_safe_groq_call: yields content deltas as Groq
+    sends them. Retries only until the first delta has gone out; a failure
+    after that ends the stream with an ERROR_IN_GROQ line. A cached response
+    is yielded as a single delta.
+    """
+    messages = _with_context(messages, context)
+    key = _fingerprint(model, messages, max_completion_tokens, temperature) if llm_cache is not None and cache else None
+    if key:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            metrics.llm_outcome("cached", model)
+            yield cached
+            return
+
+    estimate = _estimate_tokens(messages, max_completion_tokens)
+    for attempt in range(retries):
+        sent = False
+        try:
+            groq_breaker.before_call()
+            metrics.observe_stage("rate_limit_wait", await groq_limiter.acquire_async(estimate, priority))
+            started = time.perf_counter()
+            async for item in llm.astream(model, messages, max_completion_tokens, temperature):
+                if isinstance(item, LLMResponse):
+                    metrics.observe_stage("llm_call", time.perf_counter() - started)
+                    _on_response(item, model, estimate, key)
+                else:
+                    if not sent:
+                        metrics.observe_stage("llm_first_token", time.perf_counter() - started)
+                    sent = True
+                    yield item
+            return
+
+        except Exception as e:
+            decision = _on_error(e, model, attempt, retries, delay, can_retry=not sent)
+            if not decision.retry:
+                yield ("\n" if sent else "") + f"ERROR_IN_GROQ: {str(e)}"
+                return
+            await asyncio.sleep(decision.delay)
 
 def safe_groq(messages, context=None, model="llama-3.1-8b-instant",
-              max_completion_tokens=512, temperature=0.2):
-    result = _safe_groq_call(
+              max_completion_tokens=512, temperature=0.2, priority=PRIORITY_NORMAL, cache=True,
+              response_format=None):
+    # pacing now lives in groq_limiter, shared with every _safe_groq_call
+    return _safe_groq_call(
         messages=messages,
         context=context,
         model=model,
         max_completion_tokens=max_completion_tokens,
-        temperature=temperature
+        temperature=temperature,
+        priority=priority,
+        cache=cache,
+        response_format=response_format
     )
-    time.sleep(GROQ_API_DELAY)  # prevent rate-limit timeout
-    return result
 
 # --------- VECTORSTORE HELPERS ----------
+def iter_documents(source: Optional[str] = None, limit: Optional[int] = None,
+                   page_size: int = DOC_PAGE_SIZE) -> Iterator[str]:
+    """
+    Stream stored chunk texts in (source, page) order, `page_size` rows per
+    backend round trip, stopping after `limit` rows.
+    """
+    for text, _ in vector_backend.iter_documents(source, limit=limit, page_size=page_size):
+        yield text
+
 def fetch_all_documents_from_chroma() -> List[str]:
+    # name kept for existing callers; reads whichever backend is configured
     try:
-        coll = getattr(vector_store, "_collection", None)
-        if coll is not None:
-            try:
-                data = coll.get(include=["documents"])
-                docs = data.get("documents", [])
-                if docs:
-                    return docs
-            except Exception:
-                try:
-                    data = coll.get()
-                    docs = data.get("documents", []) if isinstance(data, dict) else []
-                    if docs:
-                        return docs
-                except Exception:
-                    pass
+        return list(iter_documents())
     except Exception:
-        pass
+        return []
 
-    return []
+def normalize_query(text: str) -> str:
+    # MiniLM is uncased, so case and spacing never change the embedding
+    return " ".join(text.lower().split())
 
-def retrieve_context_for_topic(topic: str, k: int = 3) -> List[str]:
+def embed_query(text: str) -> List[float]:
+    key = normalize_query(text)
+    vec = query_embedding_cache.get(key)
+    if vec is None:
+        with metrics.timed("embedding"):
+            vec = embeddings.embed_query(key)
+        query_embedding_cache.set(key, vec)
+    return vec
+
+def _retrieval_key(topic: str, k: int, source: Optional[str]) -> tuple:
+    return (normalize_query(topic), k, source, _collection_generation)
+
+def _search(key: tuple, topic: str, k: int, source: Optional[str]) -> tuple:
     try:
-        docs = vector_store.similarity_search(topic, k=k)
-        print("Retrieved docs:", len(docs))
-        for d in docs:
-            print(d.page_content[:100])
-        return [d.page_content for d in docs]
+        vector = embed_query(topic)
+        with metrics.timed("vector_search"):
+            hits = vector_backend.search(vector, k=k, source=source)
+        print("Retrieved docs:", len(hits))
+        for text, _ in hits:
+            print(text[:100])
+        texts = tuple(text for text, _ in hits)
     except Exception:
+        return ()
+
+    retrieval_cache.set(key, texts)
+    return texts
+
+def retrieve_context_for_topic(topic: str, k: int = 3, source: Optional[str] = None) -> List[str]:
+    key = _retrieval_key(topic, k, source)
+    cached = retrieval_cache.get(key)
+    if cached is not None:
+        return list(cached)
+    return list(retrieval_flight.do(key, lambda: _search(key, topic, k, source)))
+
+async def aretrieve_context_for_topic(topic: str, k: int = 3, source: Optional[str] = None) -> List[str]:
+    # cache hits are answered on the loop; embedding + search go to a worker thread
+    key = _retrieval_key(topic, k, source)
+    cached = retrieval_cache.get(key)
+    if cached is not None:
+        return list(cached)
+    texts = await retrieval_flight.ado(key, lambda: asyncio.to_thread(_search, key, topic, k, source))
+    return list(texts)
+
+# --------- QUIZ PLANNER ----------
+QUIZ_POOL_PER_QUESTION = int(os.getenv("QUIZ_POOL_PER_QUESTION", "3"))  # chunks retrieved (and kept) per question
+QUIZ_POOL_MAX = int(os.getenv("QUIZ_POOL_MAX", "36"))
+
+def _pool_k(n: int) -> int:
+    return min(max(QUIZ_POOL_PER_QUESTION * n, 6), QUIZ_POOL_MAX)
+
+def _slice_contexts(docs: List[str], n: int) -> List[str]:
+    if not docs:
         return []
+    # stored chunks are already in the embedding cache, so this is a disk read
+    vectors = embed_chunks([hash_text(d) for d in docs], docs)
+    with metrics.timed("planning"):
+        slices = partition(vectors, n, per_slice=QUIZ_POOL_PER_QUESTION)
+    return ["\n\n".join(docs[i] for i in rows) for rows in slices]
+
+def plan_quiz_contexts(topic: str, n: int, source: Optional[str] = None) -> List[str]:
+    """
+    Retrieve one candidate pool for a whole quiz and split it into up to `n`
+    distinct per-question contexts by clustering the chunk embeddings (fewer
+    when the pool is small; see quiz_slots). [] if nothing matched.
+    """
+    docs = retrieve_context_for_topic(topic, k=_pool_k(n), source=source)
+    return _slice_contexts(docs, n)
+
+async def aplan_quiz_contexts(topic: str, n: int, source: Optional[str] = None) -> List[str]:
+    """Async twin of plan_quiz_contexts."""
+    docs = await aretrieve_context_for_topic(topic, k=_pool_k(n), source=source)
+    return await asyncio.to_thread(_slice_contexts, docs, n)
+
+def quiz_slots(contexts: List[str], n: int) -> List[Tuple[str, int]]:
+    """
+    (context, angle) for each of `n` questions. When there are fewer contexts
+    than questions they are shared, and each question on a shared context gets
+    its own angle (see QUIZ_ANGLES) so the prompts, and the questions, differ.
+    """
+    if not contexts:
+        return []
+    return [(contexts[i % len(contexts)], i // len(contexts)) for i in range(n)]
 
 # --------- QUIZ LOGIC ----------
-def generate_question_rag(topic: str, difficulty: str, used_questions_texts: List[str] | None = None) -> str:
-    if used_questions_texts is None:
-        used_questions_texts = []
+DIFFICULTY_INSTRUCTIONS = {
+    "Easy":   "Create a simple recall-based MCQ about a concrete fact. Keep wording simple.",
+    "Medium": "Create a conceptual MCQ that tests understanding, not mere recall.",
+    "Hard":   "Create an analytical/application MCQ that requires reasoning from the context."
+}
+
+# "json": Groq JSON mode; "json_schema": schema-constrained output (models that support it); "text": legacy
+QUIZ_OUTPUT_FORMAT = os.getenv("QUIZ_OUTPUT_FORMAT", "json").lower()
+QUIZ_RESPONSE_FORMATS = {
+    "json": {"type": "json_object"},
+    "json_schema": {"type": "json_schema", "json_schema": {"name": "mcq_list", "schema": MCQ_JSON_SCHEMA}},
+    "text": None,
+}
+if QUIZ_OUTPUT_FORMAT not in QUIZ_RESPONSE_FORMATS:
+    raise RuntimeError(f"Unknown QUIZ_OUTPUT_FORMAT: {QUIZ_OUTPUT_FORMAT!r} (expected json, json_schema or text)")
+QUIZ_RESPONSE_FORMAT = QUIZ_RESPONSE_FORMATS[QUIZ_OUTPUT_FORMAT]
+
+def _format_rules(batch: bool) -> str:
+    """The output-format lines of a quiz prompt, for QUIZ_OUTPUT_FORMAT."""
+    if QUIZ_RESPONSE_FORMAT is not None:
+        entries = "one entry per question" if batch else "exactly one entry"
+        return f"""- Output ONLY a JSON object of this shape, with {entries} in "questions":
+{{"questions": [{{"question": "<question text>", "a": "<option a>", "b": "<option b>", "c": "<option c>", "d": "<option d>", "correct": "<a|b|c|d>"}}]}}"""
+    if batch:
+        return """- Output every question in this exact format, separated by a blank line:
+Question 1: <your question text>
+a) <option a text>
+b) <option b text>
+c) <option c text>
+d) <option d text>
+Correct: <a|b|c|d>"""
+    return """- Output must use this exact format (with newlines):
+Question: <your question text>
+a) <option a text>
+b) <option b text>
+c) <option c text>
+d) <option d text>
+Correct: <a|b|c|d>"""
+
+# what a question on a shared context should focus on; angle 0 is unconstrained
+QUIZ_ANGLES = [
+    "",
+    "a definition or key term",
+    "a cause, effect or relationship between two ideas",
+    "a specific example, name, number or date",
+    "a comparison or contrast between two ideas",
+    "a process, sequence or method",
+    "an exception, limitation or common misconception",
+]
 
-    docs = retrieve_context_for_topic(topic, k=6)
-    if not docs:
+def _angle_rule(angle: int) -> str:
+    if not angle:
         return ""
-    context = "\n\n".join(docs)
+    focus = QUIZ_ANGLES[1 + (angle - 1) % (len(QUIZ_ANGLES) - 1)]
+    return f"- Other questions are being written from this same context; focus this one on {focus}.\n"
+
+def _retry_rule(attempt: int) -> str:
+    # repeats are filtered locally (see near_duplicates); a retry just asks for another angle
+    if not attempt:
+        return ""
+    return f"- Retry {attempt}: ask about a less obvious detail of the context than a first attempt would.\n"
 
-    difficulty_instruction = {
-        "Easy":   "Create a simple recall-based MCQ about a concrete fact. Keep wording simple.",
-        "Medium": "Create a conceptual MCQ that tests understanding, not mere recall.",
-        "Hard":   "Create an analytical/application MCQ that requires reasoning from the context."
-    }[difficulty]
+def _retry_temperature(attempt: int) -> float:
+    return min(0.2 + 0.3 * attempt, 1.0)
 
-    used_json = json.dumps(used_questions_texts[-10:])
+def _question_messages(difficulty: str, attempt: int = 0, angle: int = 0) -> List[dict]:
+    difficulty_instruction = DIFFICULTY_INSTRUCTIONS[difficulty]
 
     prompt_user = f"""
 You are an ASSISTANT that must output EXACTLY one multiple-choice question in this strict format.
@@ -207,73 +777,52 @@ Difficulty: {difficulty}
 Instruction: {difficulty_instruction}
 
 ADDITIONAL RULES:
-- DO NOT repeat any question present in this JSON list (most recent first): {used_json}
-- Randomize which letter (a/b/c/d) is the correct option.
+{_angle_rule(angle)}{_retry_rule(attempt)}- Randomize which letter (a/b/c/d) is the correct option.
 - The correct option must be supported by the CONTEXT provided.
 - Provide plausible distractors for other options.
-- Output must use this exact format (with newlines):
-Question: <your question text>
-a) <option a text>
-b) <option b text>
-c) <option c text>
-d) <option d text>
-Correct: <a|b|c|d>
+{_format_rules(batch=False)}
 
 Context:
 (Use only the context to generate the question.)
 """
-    messages = [{"role": "user", "content": prompt_user}]
+    return [{"role": "user", "content": prompt_user}]
+
+def generate_question_rag(topic: str, difficulty: str, *, context: Optional[str] = None, attempt: int = 0,
+                          angle: int = 0) -> str:
+    """`context` (e.g. a slot from quiz_slots, with its `angle`) skips the per-question retrieval."""
+    if context is None:
+        docs = retrieve_context_for_topic(topic, k=6)
+        if not docs:
+            return ""
+        context = "\n\n".join(docs)
+
+    messages = _question_messages(difficulty, attempt, angle)
     #return _safe_groq_call(messages=messages, context=context, temperature=0.2, max_completion_tokens=512)
-    return safe_groq(messages=messages, context=context, temperature=0.2, max_completion_tokens=256)
+    # a cached MCQ would hand every retake the same first question
+    return safe_groq(messages=messages, context=context, temperature=_retry_temperature(attempt),
+                     max_completion_tokens=256, cache=False, response_format=QUIZ_RESPONSE_FORMAT)
+
+async def agenerate_question_rag(topic: str, difficulty: str, *, context: Optional[str] = None,
+                                 attempt: int = 0, angle: int = 0) -> str:
+    if context is None:
+        docs = await aretrieve_context_for_topic(topic, k=6)
+        if not docs:
+            return ""
+        context = "\n\n".join(docs)
+
+    messages = _question_messages(difficulty, attempt, angle)
+    return await _async_safe_groq_call(messages=messages, context=context, temperature=_retry_temperature(attempt),
+                                       max_completion_tokens=256, cache=False, response_format=QUIZ_RESPONSE_FORMAT)
 
 def parse_question_response(response: str) -> dict:
-    q = {"question": "", "a": "", "b": "", "c": "", "d": "", "correct": ""}
-
-    if not response or response.startswith("ERROR_IN_GROQ"):
-        return q
-
-    text = response.strip()
-
-    m_q = re.search(r"Question:\s*(.+?)(?=\n[a-d]\)|\nCorrect:|\Z)", text, flags=re.IGNORECASE | re.DOTALL)
-    if m_q:
-        q["question"] = m_q.group(1).strip()
-
-    option_pattern = re.compile(
-        r"(?m)^[ \t]*([abcd])\)\s*(.+?)(?=(?:\n[abcd]\)|\nCorrect:|\Z))",
-        flags=re.IGNORECASE | re.DOTALL
-    )
-    for om in option_pattern.finditer(text):
-        label = om.group(1).lower()
-        val = om.group(2).strip()
-        q[label] = re.sub(r"\s+\n\s+", " ", val)
-
-    m_corr = re.search(r"Correct:\s*([a-dA-D])", text, flags=re.IGNORECASE)
-    if m_corr:
-        q["correct"] = m_corr.group(1).lower()
-
-    if not (q["a"] and q["b"] and q["c"] and q["d"] and q["question"]):
-        return q
-
-    if not q["correct"]:
-        q["correct"] = random.choice(["a", "b", "c", "d"])
-
-    labels = ["a", "b", "c", "d"]
-    option_texts = [q[l] for l in labels]
-    correct_text = q[q["correct"]]
-
-    pairs = list(zip(labels, option_texts))
-    random.shuffle(pairs)
-    new_map = {}
-    new_correct_label = None
-    for idx, (_, opt_text) in enumerate(pairs):
-        lbl = labels[idx]
-        new_map[lbl] = opt_text
-        if opt_text == correct_text:
-            new_correct_label = lbl
-
-    q["a"], q["b"], q["c"], q["d"] = new_map["a"], new_map["b"], new_map["c"], new_map["d"]
-    q["correct"] = new_correct_label or random.choice(labels)
-    return q
+    """
+    The first valid MCQ of a completion (JSON or text, see mcq_parser) with its
+    options shuffled; empty fields when there is none.
+    """
+    questions = parse_mcqs(response)
+    if not questions:
+        return {"question": "", "a": "", "b": "", "c": "", "d": "", "correct": ""}
+    return shuffle_options(questions[0])
 
 def validate_question_data(q: dict) -> bool:
     return bool(q.get("question") and q.get("a") and q.get("b") and q.get("c") and q.get("d") and q.get("correct"))
@@ -286,23 +835,394 @@ def check_answer(question_data: dict, user_answer: str) -> bool:
 def generate_single_question(
     topic: str,
     difficulty: str,
-    used_questions_texts: Optional[List[str]] = None
+    used_questions_texts: Optional[List[str]] = None,
+    *,
+    context: Optional[str] = None,
+    angle: int = 0
 ) -> dict:
     """
     Convenience helper: generate ONE parsed MCQ dict for given topic+difficulty.
 
+    A question that paraphrases one in `used_questions_texts` is regenerated
+    with a retry prompt, at most QUIZ_TOP_UP_ROUNDS times.
     Returns {} if generation/parsing failed.
     """
     if used_questions_texts is None:
         used_questions_texts = []
 
-    raw = generate_question_rag(topic, difficulty, used_questions_texts)
-    parsed = parse_question_response(raw)
+    for attempt in range(1 + QUIZ_TOP_UP_ROUNDS):
+        raw = generate_question_rag(topic, difficulty, context=context, attempt=attempt, angle=angle)
+        with metrics.timed("parsing"):
+            parsed = parse_question_response(raw)
+
+        if not validate_question_data(parsed):
+            return {}
+        if not used_questions_texts or not near_duplicates([parsed["question"]], used_questions_texts)[0]:
+            return parsed
+    return {}
 
-    if not validate_question_data(parsed):
-        return {}
+async def agenerate_single_question(
+    topic: str,
+    difficulty: str,
+    used_questions_texts: Optional[List[str]] = None,
+    *,
+    context: Optional[str] = None,
+    angle: int = 0
+) -> dict:
+    """Async twin of generate_single_question."""
+    for attempt in range(1 + QUIZ_TOP_UP_ROUNDS):
+        raw = await agenerate_question_rag(topic, difficulty, context=context, attempt=attempt, angle=angle)
+        with metrics.timed("parsing"):
+            parsed = parse_question_response(raw)
+
+        if not validate_question_data(parsed):
+            return {}
+        if not used_questions_texts:
+            return parsed
+        dup = await asyncio.to_thread(near_duplicates, [parsed["question"]], used_questions_texts)
+        if not dup[0]:
+            return parsed
+    return {}
+
+
+# --------- DUPLICATE CHECK ----------
+QUIZ_DEDUPE_THRESHOLD = float(os.getenv("QUIZ_DEDUPE_THRESHOLD", "0.9"))  # cosine; above = same question
+QUIZ_HISTORY_SIZE = int(os.getenv("QUIZ_HISTORY_SIZE", "50"))             # recent questions compared against
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """Unit-norm embeddings for short texts, sharing the query embedding cache."""
+    keys = [normalize_query(t) for t in texts]
+    vecs = [query_embedding_cache.get(k) for k in keys]
+    missing = [i for i, v in enumerate(vecs) if v is None]
+    if missing:
+        with metrics.timed("embedding"):
+            fresh = embeddings.embed_documents([keys[i] for i in missing])
+        for i, vec in zip(missing, fresh):
+            query_embedding_cache.set(keys[i], vec)
+            vecs[i] = vec
+    mat = np.asarray(vecs, dtype=np.float32).reshape(len(texts), EMBED_DIM)
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    return mat / np.where(norms == 0, 1, norms)
+
+def near_duplicates(texts: List[str], history: List[str],
+                    threshold: float = QUIZ_DEDUPE_THRESHOLD) -> List[bool]:
+    """
+    For each of `texts`, whether it paraphrases (cosine >= threshold) one of the
+    last QUIZ_HISTORY_SIZE questions of `history` or an earlier entry of `texts`.
+    The history is checked with one matrix product.
+    """
+    if not texts:
+        return []
+    history = history[-QUIZ_HISTORY_SIZE:]
+    with metrics.timed("dedupe"):
+        vecs = embed_texts(history + texts)
+        past, new = vecs[:len(history)], vecs[len(history):]
+        dup = (new @ past.T).max(axis=1) >= threshold if history else np.zeros(len(texts), dtype=bool)
+        among = new @ new.T
+        kept, out = [], []
+        for j in range(len(texts)):
+            is_dup = bool(dup[j]) or bool(kept and float(among[j, kept].max()) >= threshold)
+            if not is_dup:
+                kept.append(j)
+            out.append(is_dup)
+    return out
+
+def _accept_distinct(candidates: List[dict], accepted: List[dict], used: List[str], n: int,
+                     threshold: float = QUIZ_DEDUPE_THRESHOLD) -> int:
+    """
+    Append candidates that are not near-duplicates of a used, accepted or earlier
+    candidate question, up to `n` accepted; returns how many were dropped.
+    """
+    dups = near_duplicates([q["question"] for q in candidates], used + [q["question"] for q in accepted], threshold)
+    dropped = 0
+    for q, dup in zip(candidates, dups):
+        if dup or len(accepted) >= n:
+            dropped += 1
+            continue
+        accepted.append(q)
+    return dropped
+
+
+# --------- BATCH QUIZ ----------
+QUIZ_BATCH_TOKENS_PER_QUESTION = 180   # completion allowance per MCQ in one batch call (JSON keys included)
+QUIZ_TOP_UP_ROUNDS = 2                 # extra batch calls for questions that failed to parse
+
+def _batch_question_messages(difficulty: str, n: int, attempt: int = 0) -> List[dict]:
+    prompt_user = f"""
+You are an ASSISTANT that must output EXACTLY {n} multiple-choice questions in this strict format.
+Do not add anything else.
+
+Difficulty: {difficulty}
+Instruction: {DIFFICULTY_INSTRUCTIONS[difficulty]}
+
+ADDITIONAL RULES:
+- Every question must test a DIFFERENT fact or idea from the context.
+{_retry_rule(attempt)}- Randomize which letter (a/b/c/d) is the correct option.
+- The correct option must be supported by the CONTEXT provided.
+- Provide plausible distractors for other options.
+{_format_rules(batch=True)}
+
+Context:
+(Use only the context to generate the questions.)
+"""
+    return [{"role": "user", "content": prompt_user}]
+
+def parse_question_batch(response: str) -> List[dict]:
+    """Every valid MCQ of a batch completion, options shuffled; malformed ones are dropped."""
+    return [shuffle_options(q) for q in parse_mcqs(response)]
 
-    return parsed
+def _batch_context_k(n: int) -> int:
+    return min(6 + n // 2, 12)
+
+def generate_questions_batch(
+    topic: str,
+    difficulty: str,
+    num_questions: int,
+    used_questions_texts: Optional[List[str]] = None
+) -> List[dict]:
+    """
+    Generate `num_questions` parsed MCQs with one retrieval and one completion;
+    questions that fail to parse (or repeat) are topped up with smaller batch
+    calls, at most QUIZ_TOP_UP_ROUNDS times. May return fewer than asked.
+    """
+    used = list(used_questions_texts or [])
+    docs = retrieve_context_for_topic(topic, k=_batch_context_k(num_questions))
+    if not docs:
+        return []
+    context = "\n\n".join(docs)
+
+    accepted: List[dict] = []
+    for attempt in range(1 + QUIZ_TOP_UP_ROUNDS):
+        missing = num_questions - len(accepted)
+        if missing <= 0:
+            break
+        messages = _batch_question_messages(difficulty, missing, attempt)
+        raw = _safe_groq_call(messages=messages, context=context, temperature=_retry_temperature(attempt),
+                              cache=False, max_completion_tokens=QUIZ_BATCH_TOKENS_PER_QUESTION * missing,
+                              response_format=QUIZ_RESPONSE_FORMAT)
+        with metrics.timed("parsing"):
+            candidates = parse_question_batch(raw)
+        _accept_distinct(candidates, accepted, used, num_questions)
+    return accepted
+
+async def agenerate_questions_batch(
+    topic: str,
+    difficulty: str,
+    num_questions: int,
+    used_questions_texts: Optional[List[str]] = None
+) -> List[dict]:
+    """Async twin of generate_questions_batch."""
+    used = list(used_questions_texts or [])
+    docs = await aretrieve_context_for_topic(topic, k=_batch_context_k(num_questions))
+    if not docs:
+        return []
+    context = "\n\n".join(docs)
+
+    accepted: List[dict] = []
+    for attempt in range(1 + QUIZ_TOP_UP_ROUNDS):
+        missing = num_questions - len(accepted)
+        if missing <= 0:
+            break
+        messages = _batch_question_messages(difficulty, missing, attempt)
+        raw = await _async_safe_groq_call(messages=messages, context=context, temperature=_retry_temperature(attempt),
+                                          cache=False, max_completion_tokens=QUIZ_BATCH_TOKENS_PER_QUESTION * missing,
+                                          response_format=QUIZ_RESPONSE_FORMAT)
+        with metrics.timed("parsing"):
+            candidates = parse_question_batch(raw)
+        await asyncio.to_thread(_accept_distinct, candidates, accepted, used, num_questions)
+    return accepted
+
+
+# --------- FAN-OUT QUIZ ----------
+async def astream_questions_fanout(
+    topic: str,
+    difficulty: str,
+    num_questions: int,
+    used_questions_texts: Optional[List[str]] = None
+) -> AsyncIterator[dict]:
+    """
+    Generate one MCQ per planned context slot (see quiz_slots), all slots
+    concurrently, and yield each one as soon as its call returns and it passes
+    validation and the near-duplicate check. Failed or dropped slots are
+    regenerated (at most QUIZ_TOP_UP_ROUNDS times). The first question costs
+    one LLM round trip, and so does the whole quiz.
+    """
+    used = list(used_questions_texts or [])
+    if num_questions <= 0:
+        return
+    slots = quiz_slots(await aplan_quiz_contexts(topic, num_questions), num_questions)
+    if not slots:
+        return
+
+    async def generate(i: int, attempt: int):
+        context, angle = slots[i]
+        raw = await _async_safe_groq_call(messages=_question_messages(difficulty, attempt, angle), context=context,
+                                          temperature=_retry_temperature(attempt), max_completion_tokens=256,
+                                          cache=False, response_format=QUIZ_RESPONSE_FORMAT)
+        return i, raw
+
+    accepted: List[dict] = []
+    pending = list(range(num_questions))
+    for attempt in range(1 + QUIZ_TOP_UP_ROUNDS):
+        tasks = [asyncio.ensure_future(generate(i, attempt)) for i in pending]
+        pending = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                i, raw = await next_done
+                with metrics.timed("parsing"):
+                    q = parse_question_response(raw)
+                # failed or paraphrased slots are retried on their own context and angle
+                if not validate_question_data(q):
+                    pending.append(i)
+                    continue
+                if await asyncio.to_thread(_accept_distinct, [q], accepted, used, num_questions):
+                    pending.append(i)
+                    continue
+                yield q
+        finally:
+            # the consumer may stop early (client gone); cancelling a task cancels its LLM call
+            # (these calls are uncached, so none is shared through llm_flight)
+            for task in tasks:
+                task.cancel()
+        if not pending:
+            break
+
+async def agenerate_questions_fanout(
+    topic: str,
+    difficulty: str,
+    num_questions: int,
+    used_questions_texts: Optional[List[str]] = None
+) -> List[dict]:
+    """All of astream_questions_fanout's questions; latency is about one LLM round trip instead of N."""
+    return [q async for q in astream_questions_fanout(topic, difficulty, num_questions, used_questions_texts)]
+
+
+# --------- QUESTION BANK ----------
+# Opt-in: every fill spends the same Groq TPM budget live quizzes and chat draw on.
+QUESTION_BANK_ENABLED = os.getenv("QUESTION_BANK", "0").lower() in ("1", "true", "yes")
+QUESTION_BANK_PATH = os.getenv("QUESTION_BANK_PATH", os.path.join(CHROMA_DIR, "question_bank.sqlite3"))
+QUESTION_BANK_PER_SOURCE = int(os.getenv("QUESTION_BANK_PER_SOURCE", "20"))    # per difficulty
+QUESTION_BANK_MIN_SCORE = float(os.getenv("QUESTION_BANK_MIN_SCORE", "0.3"))   # topic-to-chunk cosine
+
+question_bank = QuestionBank(QUESTION_BANK_PATH, EMBED_DIM) if QUESTION_BANK_ENABLED else None
+
+_bank_queue: "queue.Queue[str]" = queue.Queue()
+_bank_pending = set()
+_bank_lock = threading.Lock()
+_bank_thread: Optional[threading.Thread] = None
+
+def schedule_bank_fill(source: str) -> None:
+    """Queue `source` for a background top-up of the question bank (no-op if already queued)."""
+    global _bank_thread
+    if question_bank is None:
+        return
+    with _bank_lock:
+        if source in _bank_pending:
+            return
+        _bank_pending.add(source)
+        _bank_queue.put(source)
+        if _bank_thread is None:
+            _bank_thread = threading.Thread(target=_bank_worker, name="question-bank", daemon=True)
+            _bank_thread.start()
+
+def _bank_worker():
+    metrics.current_route.set("question_bank")
+    while True:
+        source = _bank_queue.get()
+        with _bank_lock:
+            _bank_pending.discard(source)
+        try:
+            added = fill_question_bank(source)
+            print(f"Question bank: +{added} for {source}")
+        except Exception as e:
+            print("Question bank fill failed:", source, e)
+
+def fill_question_bank(source: str, per_difficulty: int = QUESTION_BANK_PER_SOURCE) -> int:
+    """
+    Top `source` up to `per_difficulty` unserved MCQs per difficulty, one per
+    chunk not yet covered, spread evenly over the document. Runs the LLM at
+    background priority; returns how many questions were added.
+    """
+    if question_bank is None:
+        return 0
+    docs = list(vector_backend.iter_documents(source))
+    texts = [text for text, _ in docs]
+    hashes = [meta.get("doc_hash") or hash_text(text) for text, meta in docs]
+    question_bank.prune(source, set(hashes))
+    if not texts:
+        return 0
+
+    added = 0
+    for difficulty in DIFFICULTY_INSTRUCTIONS:
+        # served questions keep their chunk covered, so a refill moves on to other chunks
+        covered = question_bank.covered(source, difficulty)
+        missing = per_difficulty - question_bank.available(source, difficulty)
+        todo = [i for i, h in enumerate(hashes) if h not in covered]
+        if missing <= 0 or not todo:
+            continue
+        todo = todo[::max(1, len(todo) // missing)][:missing]
+        vectors = embed_chunks([hashes[i] for i in todo], [texts[i] for i in todo])
+        used = question_bank.questions(source, difficulty)
+        for i, vector in zip(todo, vectors):
+            raw = _safe_groq_call(messages=_question_messages(difficulty), context=texts[i],
+                                  temperature=0.2, max_completion_tokens=256,
+                                  priority=PRIORITY_BACKGROUND, cache=False, response_format=QUIZ_RESPONSE_FORMAT)
+            with metrics.timed("parsing"):
+                q = parse_question_response(raw)
+            if not validate_question_data(q) or _accept_distinct([q], [], used, 1):
+                continue
+            if question_bank.add(source, difficulty, hashes[i], q, vector):
+                used.append(q["question"])
+                added += 1
+    return added
+
+def take_bank_questions(topic: str, difficulty: str, n: int,
+                        used_questions_texts: Optional[List[str]] = None) -> List[dict]:
+    """
+    Up to `n` banked MCQs written from chunks close to `topic`. They are marked
+    served (never handed out or rewritten again), and their sources are queued
+    for a refill from chunks that have no question yet.
+    """
+    if question_bank is None or n <= 0:
+        return []
+    used = list(used_questions_texts or [])
+
+    def distinct(candidates: List[dict]) -> List[bool]:
+        # exact repeats are skipped by the bank; paraphrases of recent questions (or of
+        # each other) are passed over here and stay banked
+        return [not dup for dup in near_duplicates([q["question"] for q in candidates], used)]
+
+    vector = embed_query(topic)
+    with metrics.timed("bank_lookup"):
+        taken = question_bank.take(vector, difficulty, n, QUESTION_BANK_MIN_SCORE, used, accept=distinct)
+    for source in {source for source, _ in taken}:
+        schedule_bank_fill(source)
+    return [q for _, q in taken]
+
+async def atake_bank_questions(topic: str, difficulty: str, n: int,
+                               used_questions_texts: Optional[List[str]] = None) -> List[dict]:
+    """Async twin of take_bank_questions."""
+    return await asyncio.to_thread(take_bank_questions, topic, difficulty, n, used_questions_texts)
+
+
+# --------- PROGRESSIVE QUIZ ----------
+async def astream_quiz_questions(
+    topic: str,
+    difficulty: str,
+    num_questions: int,
+    used_questions_texts: Optional[List[str]] = None
+) -> AsyncIterator[dict]:
+    """
+    Yield up to `num_questions` validated, distinct MCQs as soon as each exists:
+    banked matches first, then fan-out generation for the rest in completion order.
+    """
+    used = list(used_questions_texts or [])
+    banked = await atake_bank_questions(topic, difficulty, num_questions, used)
+    for q in banked:
+        yield q
+    used += [q["question"] for q in banked]
+    async for q in astream_questions_fanout(topic, difficulty, num_questions - len(banked), used):
+        yield q
 
 
 # --------- DOUBT SOLVER ----------
@@ -311,10 +1231,7 @@ FOLLOW_UP_PHRASES = [
     "clarify", "make it simpler", "explain more", "expand", "elaborate"
 ]
 
-def solve_doubt(question: str, last_answer: str = "") -> str:
-    docs = retrieve_context_for_topic(question, k=8)
-    context = "\n\n".join(docs) if docs else ""
-
+def _doubt_messages(question: str, last_answer: str) -> List[dict]:
     lower_q = question.lower().strip()
     is_follow_up = any(phrase in lower_q for phrase in FOLLOW_UP_PHRASES) and bool(last_answer)
 
@@ -338,26 +1255,53 @@ User Question: {question}
 
 Answer in 2-4 sentences and, when helpful, give one brief supporting detail or example.
 """
-    messages = [{"role": "user", "content": prompt}]
+    return [{"role": "user", "content": prompt}]
+
+def solve_doubt(question: str, last_answer: str = "") -> str:
+    docs = retrieve_context_for_topic(question, k=8)
+    context = "\n\n".join(docs) if docs else ""
+
+    messages = _doubt_messages(question, last_answer)
    # return _safe_groq_call(messages=messages, context=context, temperature=0.2, max_completion_tokens=512)
-    return safe_groq(messages=messages, context=context, temperature=0.2, max_completion_tokens=512)
+    return safe_groq(messages=messages, context=context, temperature=0.2, max_completion_tokens=512,
+                     priority=PRIORITY_INTERACTIVE)
+
+async def asolve_doubt(question: str, last_answer: str = "") -> str:
+    docs = await aretrieve_context_for_topic(question, k=8)
+    context = "\n\n".join(docs) if docs else ""
+
+    messages = _doubt_messages(question, last_answer)
+    return await _async_safe_groq_call(messages=messages, context=context, temperature=0.2,
+                                       max_completion_tokens=512, priority=PRIORITY_INTERACTIVE)
+
+async def astream_doubt(question: str, last_answer: str = "") -> AsyncIterator[str]:
+    """Streaming solve_doubt: yields the answer piece by piece as Groq produces it."""
+    docs = await aretrieve_context_for_topic(question, k=8)
+    context = "\n\n".join(docs) if docs else ""
+
+    messages = _doubt_messages(question, last_answer)
+    async for delta in _async_stream_groq_call(messages=messages, context=context, temperature=0.2,
+                                               max_completion_tokens=512, priority=PRIORITY_INTERACTIVE):
+        yield delta
 
 # --------- SUMMARIZER ----------
-def summarize_notes(mode: str = "Detailed", source: str = None) -> str:
-    coll = vector_store._collection
+NO_NOTES_MESSAGE = "No notes found in the database."
 
-    if source:
-        data = coll.get(where={"source": source}, include=["documents"])
-        docs_texts = data.get("documents", [])
-    else:
-        docs_texts = fetch_all_documents_from_chroma()
-    if not docs_texts:
-        return "No notes found in the database."
+def _summary_messages(mode: str, source: Optional[str]) -> Optional[List[dict]]:
+    """
+    Map stage of the summarizer: summarise the notes chunk by chunk and return
+    the messages for the final pass, or None when there are no notes.
+    """
     if mode.lower().startswith("brief"):
         MAX_DOCS=12
     else:
         MAX_DOCS=25
-    docs_texts = docs_texts[:MAX_DOCS]
+    try:
+        docs_texts = list(iter_documents(source=source, limit=MAX_DOCS))
+    except Exception:
+        docs_texts = []
+    if not docs_texts:
+        return None
     full_text = "\n\n".join(docs_texts)
 
     max_chunk_chars =6000
@@ -383,7 +1327,8 @@ Text:
         summary = _safe_groq_call(
             messages=[{"role": "user", "content": prompt}],
             max_completion_tokens=300,
-            temperature=0.2
+            temperature=0.2,
+            priority=PRIORITY_BACKGROUND
         )
         chunk_summaries.append(f"Chunk {i+1} Summary:\n{summary}")
 
@@ -408,10 +1353,65 @@ TASK:
 
 Write the final summary below:
 """
+    return [{"role": "user", "content": final_prompt}]
+
+def summarize_notes(mode: str = "Detailed", source: str = None) -> str:
+    messages = _summary_messages(mode, source)
+    if messages is None:
+        return NO_NOTES_MESSAGE
 
     final_summary = _safe_groq_call(
-        messages=[{"role": "user", "content": final_prompt}],
+        messages=messages,
         max_completion_tokens=800,
-        temperature=0.2
+        temperature=0.2,
+        priority=PRIORITY_BACKGROUND
     )
     return final_summary
+
+async def astream_summary(mode: str = "Detailed", source: str = None) -> AsyncIterator[str]:
+    """
+    Streaming summarize_notes: the per-chunk summaries still run to completion
+    (in a worker thread), then the final summary is yielded as it is generated.
+    """
+    messages = await asyncio.to_thread(_summary_messages, mode, source)
+    if messages is None:
+        yield NO_NOTES_MESSAGE
+        return
+    async for delta in _async_stream_groq_call(messages=messages, max_completion_tokens=800,
+                                               temperature=0.2, priority=PRIORITY_BACKGROUND):
+        yield delta
+
+
+# --------- METRICS ----------
+def _metric_gauges():
+    limiter = groq_limiter.stats()
+    yield "studybuddy_rate_limit_tokens_available", "Groq TPM budget left.", {}, limiter["tokens_available"]
+    yield "studybuddy_rate_limit_requests_available", "Groq RPM budget left.", {}, limiter["requests_available"]
+    yield "studybuddy_rate_limit_queued", "Calls waiting on the rate limiter.", {}, limiter["queued"]
+    yield "studybuddy_rate_limit_wait_seconds", "Total time calls spent waiting on the limiter.", {}, limiter["wait_seconds"]
+
+    caches = {"query_embedding": query_embedding_cache, "retrieval": retrieval_cache}
+    if llm_cache is not None:
+        caches["llm"] = llm_cache
+    if question_bank is not None:
+        bank = question_bank.stats()
+        yield "studybuddy_question_bank_entries", "Pre-generated questions waiting in the bank.", {}, bank["entries"]
+        yield "studybuddy_cache_hits", "Cache hits since start.", {"cache": "question_bank"}, bank["served"]
+        yield "studybuddy_cache_misses", "Cache misses since start.", {"cache": "question_bank"}, bank["misses"]
+    for name, cache in caches.items():
+        stats = cache.stats()
+        yield "studybuddy_cache_hits", "Cache hits since start.", {"cache": name}, stats["hits"]
+        yield "studybuddy_cache_misses", "Cache misses since start.", {"cache": name}, stats["misses"]
+
+    for name, flight in (("llm", llm_flight), ("retrieval", retrieval_flight)):
+        stats = flight.stats()
+        yield "studybuddy_singleflight_executed", "Calls that ran.", {"kind": name}, stats["executed"]
+        yield "studybuddy_singleflight_coalesced", "Calls that shared an in-flight run.", {"kind": name}, stats["coalesced"]
+
+    breaker = groq_breaker.stats()
+    yield "studybuddy_llm_circuit_open", "1 while the LLM circuit breaker is open.", {}, int(breaker["state"] == "open")
+    yield "studybuddy_llm_circuit_rejected", "Calls failed fast by the open breaker.", {}, breaker["rejected"]
+
+    yield "studybuddy_vector_rows", "Chunks in the vector store.", {"backend": VECTOR_BACKEND}, vector_backend.count()
+
+metrics.register_gauges(_metric_gauges)
@@ -0,0 +1,120 @@
+# bench_ingest.py
+"""
+Chunks/sec of the old one-chunk-at-a-time ingest loop vs ai_core.ingest_pdf.
+
+Usage:
+    python bench_ingest.py path/to/notes.pdf
+
+ai_core is pointed at a scratch directory before it is imported, so the
+real Chroma store, embedding cache and ingest manifest are never touched.
+Each mode ingests into its own throwaway Chroma directory, once cold (every
+chunk is new) and once warm (every chunk is a duplicate). The bulk run uses
+the streaming extraction pipeline with INGEST_WORKERS processes.
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+# ==========================================
+# SCRATCH ENVIRONMENT (before importing ai_core)
+# ==========================================
+
+SCRATCH = tempfile.mkdtemp(prefix="bench_ingest_")
+os.environ.setdefault("LLM_PROVIDER", "fake")  # no LLM calls are made
+os.environ.setdefault("QUESTION_BANK", "0")   # no background question generation
+os.environ["CHROMA_DIR"] = os.path.join(SCRATCH, "chroma_db")
+os.environ["EMBED_CACHE_DIR"] = os.path.join(SCRATCH, "embedding_cache")
+os.environ["NUMPY_INDEX_DIR"] = os.path.join(SCRATCH, "numpy_index")
+os.environ["INGEST_MANIFEST"] = os.path.join(SCRATCH, "ingest_manifest.json")
+
+import ai_core
+from langchain_community.vectorstores import Chroma
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from embedding_cache import EmbeddingCache
+from pdf_pipeline import PdfChunkStream
+from vector_index import ChromaBackend
+
+# ==========================================
+# CONFIG
+# ==========================================
+
+COLLECTION = "bench_ingest"
+
+
+# ==========================================
+# OLD PATH (kept here only for comparison)
+# ==========================================
+
+def legacy_split(path: str) -> list:
+    docs = PyPDFLoader(path).load()
+    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
+    return [d.page_content for d in splitter.split_documents(docs)]
+
+
+def legacy_ingest(path: str) -> int:
+    store = ai_core.vector_store
+    added_count = 0
+    for i, raw in enumerate(legacy_split(path)):
+        text = ai_core.clean_text(raw)
+        if not text:
+            continue
+        doc_hash = ai_core.hash_text(text)
+        search = store._collection.get(where={"doc_hash": doc_hash}, include=["metadatas"])
+        if search and search.get("metadatas"):
+            continue
+        store.add_texts(
+            texts=[text],
+            metadatas=[{"source": os.path.basename(path), "page": i, "doc_hash": doc_hash}],
+        )
+        added_count += 1
+    store.persist()
+    return added_count
+
+
+# ==========================================
+# RUN
+# ==========================================
+
+def count_chunks(path: str) -> int:
+    return len({ai_core.hash_text(t) for _, t in PdfChunkStream(path) if t})
+
+
+def run(label: str, ingest, path: str, total: int):
+    tmp = tempfile.mkdtemp(prefix="bench_ingest_")
+    try:
+        ai_core.vector_store = Chroma(
+            collection_name=COLLECTION,
+            embedding_function=ai_core.embeddings,
+            persist_directory=tmp,
+        )
+        ai_core.vector_backend = ChromaBackend(ai_core.vector_store)
+        ai_core.INGEST_MANIFEST = os.path.join(tmp, "ingest_manifest.json")
+        ai_core._manifest = None
+        # a cold embedding cache per run, otherwise the second mode skips inference
+        ai_core.embedding_cache = EmbeddingCache(os.path.join(tmp, "embedding_cache"), ai_core.EMBED_DIM)
+        for phase in ("cold", "warm"):
+            t0 = time.perf_counter()
+            added = ingest(path)
+            dt = time.perf_counter() - t0
+            print(f"{label:<8} {phase:<5} added={added:>6}  {dt:8.2f}s  {total / dt:9.1f} chunks/sec")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit(__doc__)
+    pdf = sys.argv[1]
+
+    try:
+        total = count_chunks(pdf)
+        print(f"{os.path.basename(pdf)}: {total} unique chunks")
+
+        run("legacy", legacy_ingest, pdf, total)
+        # force=True: measure the dedupe path, not the unchanged-file shortcut
+        run("bulk", lambda p: ai_core.ingest_pdf(p, force=True), pdf, total)
+    finally:
+        shutil.rmtree(SCRATCH, ignore_errors=True)
@@ -0,0 +1,318 @@
+# bench_parse.py
+"""
+MCQ parser benchmark: how many questions mcq_parser.parse_mcqs recovers
+*correctly*, and how fast, against the regex parser it replaced.
+
+Usage:
+    python bench_parse.py [--samples 200] [--mutations 5] [--repeat 20] [--recording llm_recording.jsonl]
+
+Corpus:
+    - generated completions: known questions (including awkward values such as
+      "-3", "A*", option text starting with a label letter, answers given as
+      option text, "A:" / "d:" inside question and option text) rendered in the shapes models drift into (markdown, numbering,
+      "A."/"(a)" labels, "Answer:" lines, answers with a reason after the label,
+      wrapped lines (also wrapped right before an "A:"), headerless blocks,
+      chatter, JSON with fences / option lists / option dicts)
+    - negatives that must yield nothing (no answer, duplicate options, an
+      answer that names no option)
+    - deterministic fuzz: each generated completion rewritten `--mutations`
+      times with formatting noise that leaves its values intact (CRLF, blank
+      lines, bold labels, label styles, preambles, code fences)
+    - hostile inputs (truncated, characters deleted) that only have to not crash
+    - every quiz completion in a RecordingProvider file (LLM_PROVIDER=record);
+      there is no ground truth for these, so only the count parsed is reported
+
+A parsed question counts as correct only if its question text, all four
+options and its answer letter equal the generator's values; anything else it
+returns is counted as wrong (a corrupted value or a guessed answer).
+Needs neither ai_core nor an API key.
+"""
+import os
+import re
+import json
+import time
+import random
+import argparse
+
+from mcq_parser import LABELS, parse_mcqs
+
+# ==========================================
+# CONFIG
+# ==========================================
+
+SEED = 0
+RECORDING = os.getenv("LLM_RECORD_PATH", "./llm_recording.jsonl")
+
+QUESTIONS = [
+    {"question": "What moves water across a semi-permeable membrane?",
+     "a": "Osmosis", "b": "Diffusion of salt", "c": "Active transport", "d": "Endocytosis", "correct": "a"},
+    {"question": "Which organelle produces most of the cell's ATP?",
+     "a": "Nucleus", "b": "Mitochondria", "c": "Ribosome", "d": "Golgi body", "correct": "b"},
+    {"question": "What is a root of x^2 + x - 6 = 0?",
+     "a": "-3", "b": "3", "c": "7", "d": "-7", "correct": "a"},
+    {"question": "Which pair solves x^2 + x - 6 = 0?",
+     "a": "3 and -2", "b": "-3 and 2", "c": "-3 and -2", "d": "3 and 2", "correct": "b"},
+    {"question": "Which grade is the highest on this scale?",
+     "a": "B", "b": "A", "c": "A*", "d": "D", "correct": "c"},
+    {"question": "Which structure surrounds a plant cell's membrane?",
+     "a": "A capsule", "b": "A cell wall", "c": "A nuclear envelope", "d": "Cytoplasm", "correct": "b"},
+    {"question": "Which element is a noble gas?",
+     "a": "Nitrogen", "b": "Oxygen", "c": "Chlorine", "d": "Argon", "correct": "d"},
+    {"question": "What does the _init_ step of the algorithm set?",
+     "a": "Centroids", "b": "Labels", "c": "Distances", "d": "Weights", "correct": "a"},
+    {"question": "Which quantity is measured in ohms?",
+     "a": "Voltage", "b": "Current", "c": "Resistance", "d": "Power", "correct": "c"},
+    {"question": "Which treaty formally ended the First World War with Germany?",
+     "a": "Treaty of Versailles", "b": "Treaty of Utrecht", "c": "Peace of Westphalia",
+     "d": "Treaty of Paris", "correct": "a"},
+    {"question": "In the statement A: all squares are rectangles, what kind of claim is A?",
+     "a": "A universal claim", "b": "An existential claim", "c": "A negation", "d": "A definition", "correct": "a"},
+    {"question": "Which rubric line marks a failing grade?",
+     "a": "Band A*", "b": "Band d: below 40", "c": "Band b: 60 to 69", "d": "Band c: 50 to 59", "correct": "b"},
+]
+
+# completions that must yield no question
+NEGATIVES = [
+    "Question: Missing answer?\na) One\nb) Two\nc) Three\nd) Four",
+    "Question: Duplicates?\na) Same\nb) Same\nc) Other\nd) Else\nCorrect: c",
+    "Question: Which is a noble gas?\na) Nitrogen\nb) Argon gas\nc) Oxygen\nd) Chlorine\nCorrect: A noble gas",
+    # "c" is both a label and option d's text
+    "Question: Which grade is lowest?\na) A*\nb) A\nc) B\nd) C\nCorrect: c",
+    # the label says b, the text after it is option c's
+    "Question: Which is even?\na) One\nb) Three\nc) Two\nd) Five\nCorrect: b) Two",
+    '{"question": "Inert?", "a": "Nitrogen", "b": "Argon gas", "c": "Oxygen", "d": "Chlorine", '
+    '"correct": "A noble gas"}',
+]
+
+
+# ==========================================
+# BASELINE: the regex parser parse_mcqs replaced
+# ==========================================
+
+_LEGACY_START = re.compile(r"(?im)^[ \t*#]*(?:\d+[.)]\s*)?Question\s*\d*\s*[:.)]\**")
+
+
+def _legacy_one(text: str) -> dict:
+    q = {"question": "", "a": "", "b": "", "c": "", "d": "", "correct": ""}
+    text = text.strip()
+    m_q = re.search(r"Question:\s*(.+?)(?=\n[a-d]\)|\nCorrect:|\Z)", text, flags=re.IGNORECASE | re.DOTALL)
+    if m_q:
+        q["question"] = m_q.group(1).strip()
+    option_pattern = re.compile(r"(?m)^[ \t]*([abcd])\)\s*(.+?)(?=(?:\n[abcd]\)|\nCorrect:|\Z))",
+                                flags=re.IGNORECASE | re.DOTALL)
+    for om in option_pattern.finditer(text):
+        q[om.group(1).lower()] = re.sub(r"\s+\n\s+", " ", om.group(2).strip())
+    m_corr = re.search(r"Correct:\s*([a-dA-D])", text, flags=re.IGNORECASE)
+    if m_corr:
+        q["correct"] = m_corr.group(1).lower()
+    return q
+
+
+def legacy_parse(text: str):
+    if not text or text.startswith("ERROR_IN_GROQ"):
+        return []
+    starts = [m.start() for m in _LEGACY_START.finditer(text)]
+    out = []
+    for start, stop in zip(starts, starts[1:] + [len(text)]):
+        q = _legacy_one(_LEGACY_START.sub("Question:", text[start:stop], count=1))
+        if all(q.values()) and len({q[l].lower() for l in "abcd"}) == 4:
+            out.append(q)
+    return out
+
+
+# ==========================================
+# CORPUS
+# ==========================================
+
+def _text_block(q: dict, i: int, style: str) -> str:
+    correct = q["correct"]
+    options = [(label, q[label]) for label in LABELS]
+    if style == "plain":
+        lines = [f"Question: {q['question']}", *(f"{l}) {t}" for l, t in options), f"Correct: {correct}"]
+    elif style == "markdown":
+        lines = [f"**Question {i}:** {q['question']}", *(f"**{l})** {t}" for l, t in options),
+                 f"**Correct:** {correct}"]
+    elif style == "dotted":
+        lines = [f"{i}. Question: {q['question']}", *(f"{l.upper()}. {t}" for l, t in options),
+                 f"Answer: {correct.upper()}"]
+    elif style == "parens":
+        lines = [f"Question: {q['question']}", *(f"({l}) {t}" for l, t in options),
+                 f"Correct answer: ({correct})"]
+    elif style == "answer_text":
+        lines = [f"Question: {q['question']}", *(f"{l}) {t}" for l, t in options), f"Correct: {q[correct]}"]
+    elif style == "answer_labelled":
+        lines = [f"Question: {q['question']}", *(f"{l}) {t}" for l, t in options),
+                 f"Correct: {correct}) {q[correct]}"]
+    elif style == "answer_reason":
+        answer = (f"{correct} - because {q[correct]} fits" if i % 2 else f"({correct}) {q[correct]} is right")
+        lines = [f"Question: {q['question']}", *(f"{l}) {t}" for l, t in options), f"Correct: {answer}"]
+    elif style == "wrapped_labels":
+        # each value broken before anything that reads like a label ("A: ...", "d: ...")
+        split = lambda t: re.sub(r"\s(?=[A-Da-d]:\s)", "\n", t)
+        lines = [f"Question: {split(q['question'])}", *(f"{l}) {split(t)}" for l, t in options),
+                 f"Correct: {correct}"]
+    elif style == "headerless":
+        lines = [f"### {q['question']}", *(f"{l.upper()}. {t}" for l, t in options), f"Answer: {correct.upper()}"]
+    else:  # wrapped: question split over two lines, explanation after the answer
+        words = q["question"].split()
+        half = len(words) // 2
+        lines = [f"Question: {' '.join(words[:half])}", " ".join(words[half:]),
+                 *(f"{l}) {t}" for l, t in options), f"Correct: {correct}", "Explanation: see the notes."]
+    return "\n".join(lines)
+
+
+TEXT_STYLES = ("plain", "markdown", "dotted", "parens", "answer_text", "answer_labelled", "answer_reason",
+               "headerless", "wrapped", "wrapped_labels")
+JSON_STYLES = ("flat", "fenced", "options_list", "options_dict", "chatter")
+
+
+def _json_item(q: dict, style: str) -> dict:
+    options = [q[label] for label in LABELS]
+    if style == "options_list":
+        return {"question": q["question"], "options": options, "answer": q["correct"]}
+    if style == "options_dict":
+        return {"question": q["question"], "options": dict(zip("ABCD", options)), "correct": q[q["correct"]]}
+    return dict(q)
+
+
+def render(qs, style: str) -> str:
+    if style in TEXT_STYLES:
+        return "\n\n".join(_text_block(q, i, style) for i, q in enumerate(qs, 1))
+    if style == "chatter":
+        return "Sure! " + json.dumps(_json_item(qs[0], "flat")) + " Hope this helps."
+    text = json.dumps({"questions": [_json_item(q, style) for q in qs]})
+    return f"```json\n{text}\n```" if style == "fenced" else text
+
+
+def generate(rng: random.Random, samples: int):
+    """(completion, expected questions) pairs; every style appears."""
+    styles = TEXT_STYLES + JSON_STYLES
+    corpus = []
+    for i in range(samples):
+        style = styles[i % len(styles)]
+        n = 1 if style == "chatter" else rng.randint(1, 3)
+        qs = rng.sample(QUESTIONS, n)
+        corpus.append((render(qs, style), qs))
+    return corpus + [(text, []) for text in NEGATIVES]
+
+
+def load_recording(path: str):
+    texts = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                prompt = "\n".join(m.get("content") or "" for m in entry.get("messages", []))
+                if re.search(r"EXACTLY \w+ multiple-choice question", prompt):
+                    texts.append(entry["content"])
+    except FileNotFoundError:
+        pass
+    return texts
+
+
+def mutate(text: str, rng: random.Random) -> str:
+    """Formatting noise a model might add; question, option and answer values stay intact."""
+    if "{" in text[:20]:
+        ops = ["fence", "preamble", "crlf", "indent_json"]
+    else:
+        ops = ["crlf", "blank", "bold", "upper_labels", "dot_labels", "preamble", "trailing"]
+    for op in rng.sample(ops, k=rng.randint(1, 3)):
+        if op == "crlf":
+            text = text.replace("\n", "\r\n")
+        elif op == "blank":
+            text = re.sub(r"\n", lambda _: "\n" * rng.randint(1, 2), text)
+        elif op == "bold":
+            text = re.sub(r"(?m)^(Question[^:]*:|Correct:|[a-d]\))", r"**\1**", text)
+        elif op == "upper_labels":
+            text = re.sub(r"(?m)^([a-d])\)", lambda m: m.group(1).upper() + ")", text)
+        elif op == "dot_labels":
+            text = re.sub(r"(?m)^([a-dA-D])\)", r"\1.", text)
+        elif op == "preamble":
+            text = "Sure! Here you go:\n\n" + text
+        elif op == "trailing":
+            text = text + "\n\nLet me know if you want more questions."
+        elif op == "fence" and not text.lstrip().startswith("`"):
+            text = "```json\n" + text + "\n```"
+        elif op == "indent_json":
+            try:
+                text = json.dumps(json.loads(text), indent=2)
+            except ValueError:
+                pass
+    return text
+
+
+def hostile(text: str, rng: random.Random) -> str:
+    if rng.random() < 0.5:
+        return text[:rng.randint(0, len(text))]
+    chars = list(text)
+    for _ in range(rng.randint(1, 10)):
+        if chars:
+            del chars[rng.randrange(len(chars))]
+    return "".join(chars)
+
+
+# ==========================================
+# RUN
+# ==========================================
+
+def score(parser, corpus):
+    """(correct, wrong, expected): parsed questions equal to an expected one, parsed ones that are not."""
+    correct = wrong = expected = 0
+    for text, want in corpus:
+        remaining = list(want)
+        for q in parser(text):
+            if q in remaining:
+                remaining.remove(q)
+                correct += 1
+            else:
+                wrong += 1
+        expected += len(want)
+    return correct, wrong, expected
+
+
+def throughput(parser, texts, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            parser(text)
+    return len(texts) * repeat / (time.perf_counter() - started)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--samples", type=int, default=200)
+    ap.add_argument("--mutations", type=int, default=5)
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--recording", default=RECORDING)
+    args = ap.parse_args()
+
+    rng = random.Random(SEED)
+    generated = generate(rng, args.samples)
+    fuzzed = [(mutate(text, rng), want) for text, want in generated for _ in range(args.mutations)]
+    hostile_texts = [hostile(text, rng) for text, _ in generated for _ in range(args.mutations)]
+    recorded = load_recording(args.recording)
+
+    print(f"corpus: {len(generated)} generated ({len(NEGATIVES)} negative), {len(fuzzed)} fuzzed, "
+          f"{len(hostile_texts)} hostile, {len(recorded)} recorded")
+    texts = [t for t, _ in generated + fuzzed] + hostile_texts + recorded
+    for label, parser in (("regex", legacy_parse), ("mcq_parser", parse_mcqs)):
+        cols = []
+        for name, corpus in (("generated", generated), ("fuzzed", fuzzed)):
+            correct, wrong, expected = score(parser, corpus)
+            cols.append(f"{name} {correct}/{expected} correct ({correct / max(expected, 1):.0%}), {wrong} wrong")
+        crashes = 0
+        for text in hostile_texts:
+            try:
+                parser(text)
+            except Exception:
+                crashes += 1
+        if recorded:
+            cols.append(f"recorded {sum(len(parser(t)) for t in recorded)} parsed")
+        print(f"{label:<11} {'  '.join(cols)}  hostile crashes {crashes}  "
+              f"{throughput(parser, texts, args.repeat):9.0f} completions/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# bench_quiz.py
+"""
+Quiz generation: serial (one retrieval + completion per question) vs planned
+(one retrieval split into per-question slices, one completion per question) vs batch
+(one completion for the whole quiz, top-ups only for failed questions) vs
+fanout (one concurrent completion per context slice, embedding dedupe).
+
+Usage:
+    python bench_quiz.py [--sizes 5 10] [--runs 3] [--difficulty Medium]
+
+Runs against a scratch store filled with the synthetic notes from
+bench_retrieval. LLM_PROVIDER defaults to "fake" (see llm_provider for
+LLM_FAKE_LATENCY / LLM_FAKE_TOKENS_PER_SEC); set LLM_PROVIDER=groq to time
+the real API. Reports wall time, LLM calls, tokens and valid questions.
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import asyncio
+import argparse
+
+# fake/replay runs measure generation, not our own quota pacing
+if os.environ.get("LLM_PROVIDER", "fake") not in ("groq", "record"):
+    os.environ.setdefault("GROQ_RPM", "100000")
+    os.environ.setdefault("GROQ_TPM", "100000000")
+
+from bench_retrieval import SCRATCH, TOPICS, make_pages, write_pdf  # sets up the scratch env
+
+import ai_core
+import metrics
+
+# ==========================================
+# CONFIG
+# ==========================================
+
+DOCS = 3
+PAGES_PER_DOC = 20
+SEED = 0
+
+
+# ==========================================
+# RUN
+# ==========================================
+
+def serial(topic: str, difficulty: str, n: int):
+    used, questions = [], []
+    for _ in range(n):
+        q = ai_core.generate_single_question(topic, difficulty, used)
+        if q:
+            used.append(q["question"].strip())
+            questions.append(q)
+    return questions
+
+
+def planned(topic: str, difficulty: str, n: int):
+    used, questions = [], []
+    for context, angle in ai_core.quiz_slots(ai_core.plan_quiz_contexts(topic, n), n):
+        q = ai_core.generate_single_question(topic, difficulty, used, context=context, angle=angle)
+        if q:
+            used.append(q["question"].strip())
+            questions.append(q)
+    return questions
+
+
+def batch(topic: str, difficulty: str, n: int):
+    return ai_core.generate_questions_batch(topic, difficulty, n)
+
+
+def fanout(topic: str, difficulty: str, n: int):
+    return asyncio.run(ai_core.agenerate_questions_fanout(topic, difficulty, n))
+
+
+def measure(fn, topic: str, difficulty: str, n: int):
+    calls0 = ai_core.groq_limiter.stats()["calls"]
+    tokens0 = metrics.LLM_TOKENS.total(kind="total")
+    t0 = time.perf_counter()
+    questions = fn(topic, difficulty, n)
+    return {
+        "seconds": time.perf_counter() - t0,
+        "calls": ai_core.groq_limiter.stats()["calls"] - calls0,
+        "tokens": metrics.LLM_TOKENS.total(kind="total") - tokens0,
+        "valid": len(questions),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[5, 10])
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--difficulty", default="Medium", choices=["Easy", "Medium", "Hard"])
+    args = ap.parse_args()
+
+    rng = random.Random(SEED)
+    for d in range(DOCS):
+        path = os.path.join(SCRATCH, f"notes_{d}.pdf")
+        write_pdf(path, make_pages(rng, PAGES_PER_DOC))
+        ai_core.ingest_pdf(path)
+
+    print(f"provider={ai_core.LLM_PROVIDER} difficulty={args.difficulty} runs={args.runs}")
+    topics = list(TOPICS)
+    for n in args.sizes:
+        for label, fn in (("serial", serial), ("planned", planned), ("batch", batch), ("fanout", fanout)):
+            rows = [measure(fn, topics[r % len(topics)], args.difficulty, n) for r in range(args.runs)]
+            avg = {k: sum(r[k] for r in rows) / len(rows) for k in rows[0]}
+            print(f"n={n:<3} {label:<7} {avg['seconds']:7.2f}s  calls {avg['calls']:5.1f}  "
+                  f"tokens {avg['tokens']:8.0f}  valid {avg['valid']:4.1f}/{n}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        shutil.rmtree(SCRATCH, ignore_errors=True)
+        sys.stdout.flush()
@@ -0,0 +1,192 @@
+# bench_retrieval.py
+"""
+Retrieval benchmark on synthetic note corpora.
+
+Usage:
+    python bench_retrieval.py [--docs 5] [--pages 40] [--queries 200] [--k 6]
+
+Generates lecture-note-like PDFs locally, ingests them through the real
+ai_core.ingest_pdf path into a scratch store, then reports:
+    - ingest throughput (pages/sec, chunks/sec)
+    - p50/p95/p99 latency of retrieve_context_for_topic, cold (caches
+      cleared before every query) and warm (same queries repeated)
+    - recall@k against exact brute-force search over the stored embeddings
+
+The configured VECTOR_BACKEND is honoured, so run it once per backend to
+compare them. Nothing touches the real chroma_db / caches.
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+# ==========================================
+# SCRATCH ENVIRONMENT (before importing ai_core)
+# ==========================================
+
+SCRATCH = tempfile.mkdtemp(prefix="bench_retrieval_")
+os.environ.setdefault("LLM_PROVIDER", "fake")  # no LLM calls are made
+os.environ.setdefault("QUESTION_BANK", "0")   # no background question generation
+os.environ["CHROMA_DIR"] = os.path.join(SCRATCH, "chroma_db")
+os.environ["EMBED_CACHE_DIR"] = os.path.join(SCRATCH, "embedding_cache")
+os.environ["NUMPY_INDEX_DIR"] = os.path.join(SCRATCH, "numpy_index")
+
+import ai_core
+
+# ==========================================
+# SYNTHETIC CORPUS
+# ==========================================
+
+TOPICS = {
+    "cell biology": "cell membrane nucleus mitochondria ribosome cytoplasm organelle vesicle lysosome golgi",
+    "photosynthesis": "chlorophyll light reaction calvin cycle stomata glucose carbon dioxide thylakoid",
+    "thermodynamics": "entropy enthalpy heat engine carnot cycle temperature work internal energy",
+    "electricity": "current voltage resistance ohm circuit capacitor charge potential difference",
+    "world war": "treaty alliance trenches armistice empire mobilisation front offensive",
+    "algebra": "equation variable polynomial quadratic root factor coefficient expression",
+    "genetics": "gene allele chromosome dna mutation inheritance dominant recessive",
+    "databases": "table index query transaction join normalisation primary key schema",
+}
+FILLER = "the of and is are which this that in on for with as by from an important key concept".split()
+
+
+def make_sentence(rng: random.Random, topic: str) -> str:
+    vocab = TOPICS[topic].split()
+    words = [rng.choice(vocab) if rng.random() < 0.45 else rng.choice(FILLER) for _ in range(rng.randint(10, 20))]
+    return " ".join(words).capitalize() + "."
+
+
+def make_pages(rng: random.Random, pages: int, lines_per_page: int = 40):
+    topics = list(TOPICS)
+    out = []
+    for _ in range(pages):
+        topic = rng.choice(topics)
+        out.append([make_sentence(rng, topic) for _ in range(lines_per_page)])
+    return out
+
+
+def write_pdf(path: str, pages):
+    """Minimal single-font PDF writer: one text object per page, one line per entry."""
+    def esc(s: str) -> str:
+        return s.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in below
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for lines in pages:
+        content = "BT /F1 10 Tf 40 800 Td 13 TL " + " ".join(f"({esc(line)}) '" for line in lines) + " ET"
+        page_num = len(objects) + 1
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_num + 1} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+        kids.append(f"{page_num} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    data = b"%PDF-1.4\n"
+    offsets = []
+    for num, obj in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += f"{num} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    data += b"".join(f"{off:010d} 00000 n \n".encode() for off in offsets)
+    data += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+# ==========================================
+# MEASUREMENTS
+# ==========================================
+
+def clear_caches():
+    ai_core.query_embedding_cache.clear()
+    ai_core.retrieval_cache.clear()
+
+
+def time_queries(queries, k, cold: bool):
+    lat, results = [], []
+    for q in queries:
+        if cold:
+            clear_caches()
+        t0 = time.perf_counter()
+        results.append(ai_core.retrieve_context_for_topic(q, k=k))
+        lat.append((time.perf_counter() - t0) * 1000)
+    return np.array(lat), results
+
+
+def exact_top_k(queries, k):
+    texts, vecs = [], []
+    for _, text, _, vec in ai_core.vector_backend.iter_rows():
+        texts.append(text)
+        vecs.append(vec)
+    mat = np.asarray(vecs, dtype=np.float32)
+    mat /= np.linalg.norm(mat, axis=1, keepdims=True)
+    out = []
+    for q in queries:
+        qv = np.asarray(ai_core.embeddings.embed_query(ai_core.normalize_query(q)), dtype=np.float32)
+        scores = mat @ (qv / np.linalg.norm(qv))
+        out.append([texts[i] for i in np.argsort(-scores)[:k]])
+    return out
+
+
+def pct(lat, p) -> float:
+    return float(np.percentile(lat, p))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--docs", type=int, default=5)
+    ap.add_argument("--pages", type=int, default=40, help="pages per document")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=6)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"backend={ai_core.VECTOR_BACKEND} docs={args.docs} pages/doc={args.pages} k={args.k}")
+
+    # ---- ingest ----
+    pdfs = []
+    for d in range(args.docs):
+        path = os.path.join(SCRATCH, f"notes_{d}.pdf")
+        write_pdf(path, make_pages(rng, args.pages))
+        pdfs.append(path)
+
+    t0 = time.perf_counter()
+    chunks = sum(ai_core.ingest_pdf(p) for p in pdfs)
+    dt = time.perf_counter() - t0
+    print(f"ingest   {chunks} chunks in {dt:.2f}s  "
+          f"{args.docs * args.pages / dt:.1f} pages/sec  {chunks / dt:.1f} chunks/sec")
+
+    # ---- queries ----
+    topics = list(TOPICS)
+    queries = [" ".join(rng.sample(TOPICS[rng.choice(topics)].split(), 3)) for _ in range(args.queries)]
+
+    cold, results = time_queries(queries, args.k, cold=True)
+    time_queries(queries, args.k, cold=False)  # prime the caches
+    warm, _ = time_queries(queries, args.k, cold=False)
+    for label, lat in (("cold", cold), ("warm", warm)):
+        print(f"query {label}  p50 {pct(lat, 50):8.3f}ms  p95 {pct(lat, 95):8.3f}ms  p99 {pct(lat, 99):8.3f}ms")
+
+    exact = exact_top_k(queries, args.k)
+    recall = np.mean([len(set(r) & set(e)) / max(len(e), 1) for r, e in zip(results, exact)])
+    print(f"recall@{args.k} vs exact search: {recall:.3f}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        shutil.rmtree(SCRATCH, ignore_errors=True)
+        sys.stdout.flush()
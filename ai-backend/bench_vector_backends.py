@@ -0,0 +1,110 @@
+# bench_vector_backends.py
+"""
+Top-k latency of the Chroma backend vs the in-process numpy index.
+
+Usage:
+    python bench_vector_backends.py [N ...]      (default: 1000 10000 100000)
+
+Uses random unit vectors with MiniLM's dimensionality, so no model is loaded.
+Reports build time, p50/p95 query latency (unfiltered and filtered by one
+source) and Chroma's recall@k against the exact numpy result.
+"""
+import sys
+import time
+import shutil
+import tempfile
+
+import numpy as np
+from langchain_community.vectorstores import Chroma
+
+from vector_index import ChromaBackend, NumpyVectorIndex
+
+# ==========================================
+# CONFIG
+# ==========================================
+
+DIM = 384
+K = 6
+QUERIES = 200
+SOURCES = 20
+INSERT_BATCH = 5000
+SEED = 0
+
+
+# ==========================================
+# HELPERS
+# ==========================================
+
+def make_corpus(n: int, rng):
+    vecs = rng.standard_normal((n, DIM)).astype(np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    ids = [f"id{i}" for i in range(n)]
+    texts = [f"chunk {i}" for i in range(n)]
+    metas = [{"source": f"notes_{i % SOURCES}.pdf", "page": i, "doc_hash": f"h{i}"} for i in range(n)]
+    return ids, vecs, texts, metas
+
+
+def build(backend, ids, vecs, texts, metas) -> float:
+    t0 = time.perf_counter()
+    for s in range(0, len(ids), INSERT_BATCH):
+        e = s + INSERT_BATCH
+        backend.add(ids[s:e], vecs[s:e].tolist(), texts[s:e], metas[s:e])
+    return time.perf_counter() - t0
+
+
+def run_queries(backend, queries, source=None):
+    lat, results = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        hits = backend.search(q, K, source=source)
+        lat.append((time.perf_counter() - t0) * 1000)
+        results.append([text for text, _ in hits])
+    return np.array(lat), results
+
+
+def recall(approx, exact) -> float:
+    return float(np.mean([len(set(a) & set(e)) / max(len(e), 1) for a, e in zip(approx, exact)]))
+
+
+def report(label, n, build_s, lat, lat_f, rec=None):
+    rec_s = f"{rec:6.3f}" if rec is not None else "   -  "
+    print(f"{label:<14} {n:>7}  build {build_s:7.2f}s  "
+          f"p50 {np.percentile(lat, 50):7.3f}ms  p95 {np.percentile(lat, 95):7.3f}ms  "
+          f"filtered p50 {np.percentile(lat_f, 50):7.3f}ms  recall@{K} {rec_s}")
+
+
+# ==========================================
+# RUN
+# ==========================================
+
+def bench(n: int):
+    rng = np.random.default_rng(SEED)
+    ids, vecs, texts, metas = make_corpus(n, rng)
+    queries = rng.standard_normal((QUERIES, DIM)).astype(np.float32).tolist()
+    source = "notes_3.pdf"
+
+    tmp = tempfile.mkdtemp(prefix="bench_vectors_")
+    try:
+        exact = None
+        for dtype in ("float32", "float16"):
+            index = NumpyVectorIndex(f"{tmp}/numpy_{dtype}", DIM, dtype=dtype)
+            build_s = build(index, ids, vecs, texts, metas)
+            lat, res = run_queries(index, queries)
+            lat_f, _ = run_queries(index, queries, source)
+            if exact is None:
+                exact = res
+            report(f"numpy/{dtype}", n, build_s, lat, lat_f, recall(res, exact))
+
+        chroma = ChromaBackend(Chroma(collection_name="bench", persist_directory=f"{tmp}/chroma"))
+        build_s = build(chroma, ids, vecs, texts, metas)
+        lat, res = run_queries(chroma, queries)
+        lat_f, _ = run_queries(chroma, queries, source)
+        report("chroma", n, build_s, lat, lat_f, recall(res, exact))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [1000, 10000, 100000]
+    for n in sizes:
+        bench(n)
@@ -0,0 +1,92 @@
+# embedding_cache.py
+"""
+Content-addressed on-disk cache of embedding vectors, keyed by doc_hash.
+
+Layout of a cache directory:
+    vectors.f32   float32 rows back to back (memory-mapped for reads)
+    keys.txt      one hash per line; line N is the key of row N
+
+Both files are append-only. Vectors are written before their keys, so after a
+crash any trailing rows without a key are truncated away on the next open.
+"""
+import os
+import threading
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+
+class EmbeddingCache:
+    def __init__(self, directory: str, dim: int):
+        self.directory = directory
+        self.dim = dim
+        self._vec_path = os.path.join(directory, "vectors.f32")
+        self._key_path = os.path.join(directory, "keys.txt")
+        self._row_bytes = dim * 4
+        self._lock = threading.Lock()
+        self._index: Dict[str, int] = {}
+        self._mmap = None
+
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        keys: List[str] = []
+        if os.path.exists(self._key_path):
+            with open(self._key_path, "r", encoding="ascii") as f:
+                keys = [line.strip() for line in f if line.strip()]
+
+        vec_rows = os.path.getsize(self._vec_path) // self._row_bytes if os.path.exists(self._vec_path) else 0
+        rows = min(len(keys), vec_rows)
+
+        # drop anything a crash left half-written
+        if len(keys) != rows:
+            with open(self._key_path, "w", encoding="ascii") as f:
+                f.writelines(k + "\n" for k in keys[:rows])
+        if os.path.exists(self._vec_path) and os.path.getsize(self._vec_path) != rows * self._row_bytes:
+            with open(self._vec_path, "r+b") as f:
+                f.truncate(rows * self._row_bytes)
+
+        self._index = {k: i for i, k in enumerate(keys[:rows])}
+
+    def _vectors(self) -> np.ndarray:
+        rows = len(self._index)
+        if self._mmap is None or self._mmap.shape[0] != rows:
+            self._mmap = np.memmap(self._vec_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        return self._mmap
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Return {key: vector} for the keys that are cached; misses are omitted."""
+        with self._lock:
+            rows = {k: self._index[k] for k in keys if k in self._index}
+            if not rows:
+                return {}
+            mat = self._vectors()
+            return {k: np.array(mat[r]) for k, r in rows.items()}
+
+    def put_many(self, keys: Sequence[str], vectors) -> int:
+        """Append vectors for keys not already cached; returns how many were written."""
+        with self._lock:
+            fresh = {}
+            for k, v in zip(keys, vectors):
+                if k not in self._index and k not in fresh:
+                    fresh[k] = v
+            if not fresh:
+                return 0
+
+            mat = np.asarray(list(fresh.values()), dtype=np.float32).reshape(len(fresh), self.dim)
+            with open(self._vec_path, "ab") as f:
+                f.write(mat.tobytes())
+            with open(self._key_path, "a", encoding="ascii") as f:
+                f.writelines(k + "\n" for k in fresh)
+
+            base = len(self._index)
+            for i, k in enumerate(fresh):
+                self._index[k] = base + i
+            return len(fresh)
@@ -0,0 +1,285 @@
+# llm_provider.py
+"""
+Chat-completion providers behind ai_core's _safe_groq_call.
+
+    groq    the real Groq API
+    record  Groq, plus every request/response pair appended to a JSONL file
+    replay  answers from a recorded JSONL file, falling back to `fake`
+    fake    deterministic synthetic answers built from the prompt's context
+
+replay and fake need no API key or network; they sleep `latency` seconds
+(time to first token) plus completion_tokens / `tokens_per_second`, so the
+RAG stack can be profiled end to end offline. They send no rate-limit
+headers, so raise GROQ_RPM / GROQ_TPM when load-testing against them.
+
+Every provider has the same three calls:
+    complete(model, messages, max_completion_tokens, temperature, response_format=None) -> LLMResponse
+    acomplete(...)  -> LLMResponse
+    astream(...)    -> async iterator of str deltas, then one final LLMResponse
+
+`response_format` is Groq's ({"type": "json_object"} or a "json_schema" one);
+the fake provider answers JSON whenever it is set.
+"""
+import re
+import json
+import time
+import random
+import asyncio
+import threading
+from dataclasses import dataclass
+from typing import AsyncIterator, List, Mapping, Optional, Union
+
+from llm_cache import prompt_fingerprint
+
+
+@dataclass
+class LLMResponse:
+    content: str
+    total_tokens: Optional[int] = None
+    headers: Optional[Mapping[str, str]] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+
+
+def _from_usage(content: str, usage, headers) -> LLMResponse:
+    return LLMResponse(
+        content,
+        getattr(usage, "total_tokens", None),
+        headers,
+        getattr(usage, "prompt_tokens", None),
+        getattr(usage, "completion_tokens", None),
+    )
+
+
+def _request_key(model: str, messages: List[dict], max_completion_tokens: int, temperature: float,
+                 response_format: Optional[dict] = None) -> str:
+    params = {"response_format": response_format} if response_format else {}
+    return prompt_fingerprint(model, messages, max_completion_tokens=max_completion_tokens,
+                              temperature=temperature, **params)
+
+
+def _approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+# --------- GROQ ----------
+class GroqProvider:
+    def __init__(self, api_key: str):
+        from groq import AsyncGroq, Groq
+        # retries belong to retry_policy (which also paces the shared limiter);
+        # the SDK's own silent retries would multiply every attempt
+        self.client = Groq(api_key=api_key, max_retries=0)
+        self.async_client = AsyncGroq(api_key=api_key, max_retries=0)
+
+    def complete(self, model, messages, max_completion_tokens, temperature, response_format=None) -> LLMResponse:
+        raw = self.client.chat.completions.with_raw_response.create(
+            model=model,
+            messages=messages,
+            max_completion_tokens=max_completion_tokens,
+            temperature=temperature,
+            **({"response_format": response_format} if response_format else {}),
+        )
+        completion = raw.parse()
+        return _from_usage(completion.choices[0].message.content, getattr(completion, "usage", None), raw.headers)
+
+    async def acomplete(self, model, messages, max_completion_tokens, temperature,
+                        response_format=None) -> LLMResponse:
+        raw = await self.async_client.chat.completions.with_raw_response.create(
+            model=model,
+            messages=messages,
+            max_completion_tokens=max_completion_tokens,
+            temperature=temperature,
+            **({"response_format": response_format} if response_format else {}),
+        )
+        completion = await raw.parse()
+        return _from_usage(completion.choices[0].message.content, getattr(completion, "usage", None), raw.headers)
+
+    async def astream(self, model, messages, max_completion_tokens,
+                      temperature) -> AsyncIterator[Union[str, LLMResponse]]:
+        raw = await self.async_client.chat.completions.with_raw_response.create(
+            model=model,
+            messages=messages,
+            max_completion_tokens=max_completion_tokens,
+            temperature=temperature,
+            stream=True,
+        )
+        stream = await raw.parse()
+        parts, usage = [], None
+        async for chunk in stream:
+            x_groq = getattr(chunk, "x_groq", None)
+            if x_groq is not None and x_groq.usage is not None:
+                usage = x_groq.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+        yield _from_usage("".join(parts), usage, raw.headers)
+
+
+# --------- RECORD ----------
+class RecordingProvider:
+    """Wraps another provider and appends each completed call to a JSONL file."""
+
+    def __init__(self, inner, path: str):
+        self.inner = inner
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _record(self, model, messages, max_completion_tokens, temperature, resp: LLMResponse, seconds: float,
+                response_format: Optional[dict] = None):
+        entry = {
+            "key": _request_key(model, messages, max_completion_tokens, temperature, response_format),
+            "model": model,
+            "messages": messages,
+            "max_completion_tokens": max_completion_tokens,
+            "temperature": temperature,
+            "response_format": response_format,
+            "content": resp.content,
+            "total_tokens": resp.total_tokens,
+            "prompt_tokens": resp.prompt_tokens,
+            "completion_tokens": resp.completion_tokens,
+            "seconds": round(seconds, 4),
+        }
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def complete(self, model, messages, max_completion_tokens, temperature, response_format=None) -> LLMResponse:
+        started = time.perf_counter()
+        resp = self.inner.complete(model, messages, max_completion_tokens, temperature, response_format)
+        self._record(model, messages, max_completion_tokens, temperature, resp, time.perf_counter() - started,
+                     response_format)
+        return resp
+
+    async def acomplete(self, model, messages, max_completion_tokens, temperature,
+                        response_format=None) -> LLMResponse:
+        started = time.perf_counter()
+        resp = await self.inner.acomplete(model, messages, max_completion_tokens, temperature, response_format)
+        self._record(model, messages, max_completion_tokens, temperature, resp, time.perf_counter() - started,
+                     response_format)
+        return resp
+
+    async def astream(self, model, messages, max_completion_tokens, temperature):
+        started = time.perf_counter()
+        async for item in self.inner.astream(model, messages, max_completion_tokens, temperature):
+            if isinstance(item, LLMResponse):
+                self._record(model, messages, max_completion_tokens, temperature, item,
+                             time.perf_counter() - started)
+            yield item
+
+
+# --------- FAKE ----------
+CONTEXT_RE = re.compile(r"CONTEXT START:\s*(.*?)\s*CONTEXT END", re.DOTALL)
+
+
+def fake_completion(messages: List[dict], max_completion_tokens: int, json_mode: bool = False) -> str:
+    """Deterministic stand-in answer shaped like what each ai_core prompt expects."""
+    prompt = "\n".join(m.get("content") or "" for m in messages)
+    rng = random.Random(prompt)
+    m = CONTEXT_RE.search(prompt)
+    words = re.findall(r"[A-Za-z][A-Za-z-]{3,}", m.group(1) if m else prompt) or ["notes"]
+
+    def phrase(n: int) -> str:
+        return " ".join(rng.choice(words) for _ in range(n))
+
+    mcq = re.search(r"EXACTLY (\w+) multiple-choice question", prompt)
+    if mcq and json_mode:
+        count = int(mcq.group(1)) if mcq.group(1).isdigit() else 1
+        items = [{"question": f"What does the text say about {phrase(4)}?",
+                  **{label: phrase(3) for label in "abcd"}, "correct": rng.choice("abcd")}
+                 for _ in range(count)]
+        return json.dumps({"questions": items})
+    if mcq:
+        count = int(mcq.group(1)) if mcq.group(1).isdigit() else 1
+        blocks = []
+        for i in range(count):
+            head = f"Question {i + 1}:" if mcq.group(1).isdigit() else "Question:"
+            options = "\n".join(f"{label}) {phrase(3)}" for label in "abcd")
+            blocks.append(f"{head} What does the text say about {phrase(4)}?\n{options}\nCorrect: {rng.choice('abcd')}")
+        text = "\n\n".join(blocks)
+    elif "bullet" in prompt.lower():
+        text = "\n".join(f"- {phrase(12).capitalize()}." for _ in range(5))
+    else:
+        text = " ".join(f"{phrase(14).capitalize()}." for _ in range(3))
+    return text[:max_completion_tokens * 4]
+
+
+class FakeProvider:
+    def __init__(self, latency: float = 0.3, tokens_per_second: float = 500.0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+
+    def _answer(self, model, messages, max_completion_tokens, temperature, response_format=None) -> str:
+        return fake_completion(messages, max_completion_tokens, json_mode=bool(response_format))
+
+    def _response(self, messages, content: str) -> LLMResponse:
+        prompt = sum(len(m.get("content") or "") for m in messages) // 4
+        completion = _approx_tokens(content)
+        return LLMResponse(content, prompt + completion, None, prompt, completion)
+
+    def _generation_seconds(self, content: str) -> float:
+        if self.tokens_per_second <= 0:
+            return 0.0
+        return _approx_tokens(content) / self.tokens_per_second
+
+    def complete(self, model, messages, max_completion_tokens, temperature, response_format=None) -> LLMResponse:
+        content = self._answer(model, messages, max_completion_tokens, temperature, response_format)
+        time.sleep(self.latency + self._generation_seconds(content))
+        return self._response(messages, content)
+
+    async def acomplete(self, model, messages, max_completion_tokens, temperature,
+                        response_format=None) -> LLMResponse:
+        content = self._answer(model, messages, max_completion_tokens, temperature, response_format)
+        await asyncio.sleep(self.latency + self._generation_seconds(content))
+        return self._response(messages, content)
+
+    async def astream(self, model, messages, max_completion_tokens, temperature):
+        content = self._answer(model, messages, max_completion_tokens, temperature)
+        await asyncio.sleep(self.latency)
+        for piece in re.findall(r"\S+\s*", content):
+            await asyncio.sleep(self._generation_seconds(piece))
+            yield piece
+        yield self._response(messages, content)
+
+
+# --------- REPLAY ----------
+class ReplayProvider(FakeProvider):
+    """
+    Serves recorded responses by request fingerprint with the configured
+    latency/token rate. Unrecorded requests get a fake answer, or raise
+    KeyError when `strict`.
+    """
+
+    def __init__(self, path: str, latency: float = 0.3, tokens_per_second: float = 500.0, strict: bool = False):
+        super().__init__(latency, tokens_per_second)
+        self.strict = strict
+        self.responses = {}
+        self.misses = 0
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.responses[entry["key"]] = entry["content"]
+
+    def _answer(self, model, messages, max_completion_tokens, temperature, response_format=None) -> str:
+        key = _request_key(model, messages, max_completion_tokens, temperature, response_format)
+        if key in self.responses:
+            return self.responses[key]
+        self.misses += 1
+        if self.strict:
+            raise KeyError(f"no recorded response for request {key[:12]}")
+        return fake_completion(messages, max_completion_tokens, json_mode=bool(response_format))
+
+
+def make_provider(kind: str, api_key: Optional[str] = None, record_path: str = "llm_recording.jsonl",
+                  replay_path: str = "llm_recording.jsonl", latency: float = 0.3,
+                  tokens_per_second: float = 500.0, strict: bool = False):
+    kind = kind.lower()
+    if kind in ("groq", "record"):
+        if not api_key:
+            raise RuntimeError("Please set GROQ_API_KEY in ai-backend/.env (GROQ_API_KEY=...)")
+        provider = GroqProvider(api_key)
+        return RecordingProvider(provider, record_path) if kind == "record" else provider
+    if kind == "replay":
+        return ReplayProvider(replay_path, latency, tokens_per_second, strict)
+    if kind == "fake":
+        return FakeProvider(latency, tokens_per_second)
+    raise RuntimeError(f"Unknown LLM_PROVIDER: {kind!r} (expected groq, record, replay or fake)")
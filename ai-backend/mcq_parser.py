@@ -0,0 +1,250 @@
+# mcq_parser.py
+"""
+Validating parser for generated multiple-choice questions.
+
+parse_mcqs(text) accepts either output mode of the quiz prompts and returns
+every question that validates, as {"question", "a", "b", "c", "d", "correct"}:
+
+    JSON   {"questions": [{"question": ..., "a": ..., "b": ..., "c": ..., "d": ..., "correct": "b"}]}
+           (also a bare object or list, code fences, "options" as a list or
+           dict, "answer" for "correct", or the answer given as option text)
+    text   "Question: ..." / "a) ..." ... "Correct: b" blocks, read line by line
+           in one pass; tolerates numbering, markdown bold/headers/bullets,
+           "A." / "(a)" option labels, "Answer:" lines ("Correct: b - because ..."),
+           wrapped lines and chatter before or after the questions
+
+Options have to come in order: a label line only starts option a right after
+the question, b right after a, and so on. Anything else that looks like a
+label ("A:" inside a wrapped question, "d:" inside an option) continues the
+current field. A second "a" line before any "b" means the first one was part
+of the question.
+
+A question is valid when its text and all four options are non-empty, the
+options are distinct and the answer names one of them. Nothing is guessed:
+a question without a usable answer is dropped.
+"""
+import re
+import json
+import random
+from typing import List, Optional
+
+LABELS = ("a", "b", "c", "d")
+
+# the JSON output mode's shape, for response_format={"type": "json_schema", ...}
+MCQ_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "questions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "question": {"type": "string"},
+                    **{label: {"type": "string"} for label in LABELS},
+                    "correct": {"type": "string", "enum": list(LABELS)},
+                },
+                "required": ["question", *LABELS, "correct"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["questions"],
+    "additionalProperties": False,
+}
+
+# markdown a model wraps around a line's label ("### Question 1:", "- **a)**", "> Answer:");
+# only stripped when a label follows, never from question/option/answer text
+_MARKUP = r"[\s>#*_-]*"
+_BOLD = r"(?:\*\*|__)?"
+_QUESTION = re.compile(_MARKUP + r"(?:\d+\s*[.)]\s*)?(?:question|q)\s*\d*\s*[:.)]" + _BOLD + r"\s*(.*)$",
+                       re.IGNORECASE)
+_OPTION = re.compile(_MARKUP + r"\(?([a-dA-D])\s*[).:\]]" + _BOLD + r"\s*(.*)$")
+_ANSWER = re.compile(_MARKUP + r"(?:correct(?:\s+(?:answer|option))?|answer)\s*[:=-]" + _BOLD + r"\s*(.*)$",
+                     re.IGNORECASE)
+_HEADING = re.compile(r"^#+\s*")
+_WRAPPED = re.compile(r"^(\*\*|__)(.+)\1$")
+# an answer that is just a label: "b", "B.", "(c)", "Option D"
+_ANSWER_LABEL = re.compile(r"^(?:option\s+)?\(?([a-d])\)?\.?$", re.IGNORECASE)
+# a label, a separator, then anything: "a) A unique row identifier", "(b) two is right", "b - because two"
+_ANSWER_LABELLED = re.compile(r"^(?:option\s+)?(?:\(([a-d])\)|([a-d])\s*(?:[).:,\]]|\s[-\u2013\u2014]))\s*(.+)$",
+                              re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+
+
+def _squash(s) -> str:
+    return _SPACES.sub(" ", str(s)).strip() if s is not None else ""
+
+
+def _answer_label(answer: str, q: dict) -> str:
+    """The option `answer` names, or "" when it names none of them unambiguously."""
+    lowered = answer.lower()
+    by_text = [label for label in LABELS if q[label].lower() == lowered]
+    m = _ANSWER_LABEL.match(answer)
+    if m:
+        # "a" when option b reads "A" could mean either
+        return m.group(1).lower() if not by_text or by_text == [m.group(1).lower()] else ""
+    if by_text:
+        return by_text[0]
+    m = _ANSWER_LABELLED.match(answer)
+    if not m:
+        return ""
+    label, rest = (m.group(1) or m.group(2)).lower(), m.group(3).lower()
+    # the text after the label is free (an explanation, a restated option) unless it
+    # is another option's text: "b) Two" when c reads "Two" contradicts itself
+    others = [other for other in LABELS if other != label and q[other].lower() == rest]
+    return "" if others else label
+
+
+def validate_mcq(raw: dict) -> Optional[dict]:
+    """Normalised question dict, or None if `raw` is not a usable MCQ."""
+    q = {"question": _squash(raw.get("question"))}
+    for label in LABELS:
+        q[label] = _squash(raw.get(label))
+    if not all(q.values()):
+        return None
+    if len({q[label].lower() for label in LABELS}) != 4:
+        return None
+    q["correct"] = _answer_label(_squash(raw.get("correct")), q)
+    return q if q["correct"] else None
+
+
+# --------- JSON ----------
+def _load_json(text: str):
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        text = text[text.find("\n") + 1:] if "\n" in text else text
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    # chatter around the payload: take the outermost object/array
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return None
+    start = min(starts)
+    end = text.rfind("}" if text[start] == "{" else "]")
+    try:
+        return json.loads(text[start:end + 1]) if end > start else None
+    except ValueError:
+        return None
+
+
+def _json_item(item) -> dict:
+    if not isinstance(item, dict):
+        return {}
+    raw = {k.lower(): v for k, v in item.items() if isinstance(k, str)}
+    options = raw.get("options", raw.get("choices"))
+    if isinstance(options, dict):
+        raw.update({str(k).lower().strip("() ."): v for k, v in options.items()})
+    elif isinstance(options, list) and len(options) == 4:
+        raw.update(zip(LABELS, options))
+    if "correct" not in raw:
+        raw["correct"] = raw.get("answer", raw.get("correct_option", raw.get("correct_answer")))
+    return raw
+
+
+def parse_mcq_json(text: str) -> List[dict]:
+    data = _load_json(text)
+    if isinstance(data, dict):
+        items = data.get("questions", [data]) if "question" not in data else [data]
+    elif isinstance(data, list):
+        items = data
+    else:
+        return []
+    out = []
+    for item in items if isinstance(items, list) else []:
+        q = validate_mcq(_json_item(item))
+        if q:
+            out.append(q)
+    return out
+
+
+# --------- TEXT ----------
+def parse_mcq_text(text: str) -> List[dict]:
+    questions: List[dict] = []
+    cur: Optional[dict] = None
+    field: Optional[str] = None       # where a wrapped line continues
+    loose: List[str] = []             # unlabelled lines since the last block
+    raw_a = ""                        # option a's lines as written, in case they were the question's
+
+    def body(m) -> str:
+        # "**a) Nucleus**": the bold opened before the label closes at the end of the line
+        text = m.group(m.lastindex)
+        opened = m.string[:m.start(m.lastindex)]
+        for mark in ("**", "__"):
+            if opened.count(mark) % 2 and text.endswith(mark):
+                return text[:-len(mark)].rstrip()
+        return text
+
+    def finish():
+        if cur is not None:
+            q = validate_mcq(cur)
+            if q:
+                questions.append(q)
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+
+        m = _QUESTION.match(line)
+        if m:
+            finish()
+            cur, field, loose = {"question": body(m)}, "question", []
+            continue
+
+        m = _ANSWER.match(line)
+        if m:
+            if cur is not None:
+                cur["correct"] = body(m)
+            field = None
+            continue
+
+        m = _OPTION.match(line)
+        label = m.group(1).lower() if m else None
+        if label == "a" and cur is not None and field == "a" and not cur.get("correct"):
+            # "A: ..." was a wrapped line of the question, this is the real option a
+            cur["question"] = f"{cur['question']} {raw_a}"
+            field = "question"
+        if label == "a" and (cur is None or cur.get("correct") or cur.get("d")):
+            # a block with no "Question:" header; its question is the line before
+            finish()
+            cur, field = {"question": loose[-1] if loose else ""}, "question"
+        if label and cur is not None and field == ("question", *LABELS)[LABELS.index(label)]:
+            cur[label] = body(m)
+            field, loose = label, []
+            if label == "a":
+                raw_a = line
+            continue
+
+        if cur is not None and field is not None:
+            cur[field] = f"{cur.get(field, '')} {line}"
+            if field == "a":
+                raw_a = f"{raw_a} {line}"
+        else:
+            # a headerless question, possibly "### ..." or "**...**"
+            loose.append(_WRAPPED.sub(r"\2", _HEADING.sub("", line)))
+
+    finish()
+    return questions
+
+
+def parse_mcqs(text: Optional[str]) -> List[dict]:
+    """Every valid MCQ in a completion, JSON or text."""
+    if not text or text.startswith("ERROR_IN_GROQ"):
+        return []
+    head = text.lstrip()[:1]
+    if head in ("{", "[", "`"):
+        return parse_mcq_json(text) or parse_mcq_text(text)
+    return parse_mcq_text(text) or (parse_mcq_json(text) if "{" in text else [])
+
+
+def shuffle_options(q: dict, rng: random.Random = random) -> dict:
+    """Same question with its options in random order, so the answer letter carries no pattern."""
+    correct_text = q[q["correct"]]
+    options = [q[label] for label in LABELS]
+    rng.shuffle(options)
+    out = {"question": q["question"], **dict(zip(LABELS, options))}
+    out["correct"] = LABELS[options.index(correct_text)]
+    return out
@@ -0,0 +1,161 @@
+# metrics.py
+"""
+Process-wide latency histograms, counters and gauges for GET /metrics
+(Prometheus text format).
+
+Stage timings are labelled with the HTTP route that caused them. The route
+lives in a contextvar set by server.py's middleware (and by the background
+job threads), so ai_core records stages without passing the route around.
+"""
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# seconds; wide enough for a cached lookup (ms) up to a full summary (minutes)
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+current_route = contextvars.ContextVar("current_route", default="none")
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(**labels) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    items = labels + extra
+    if not items:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+def _fmt_value(v: float) -> str:
+    v = float(v)
+    return str(int(v)) if v.is_integer() else repr(v)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series: Dict[Labels, list] = {}   # labels -> [count per bucket..., +Inf, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _labels(**labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self._series.items())
+            items = [(k, list(v)) for k, v in items]
+        for labels, series in items:
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_fmt_labels(labels, (('le', _fmt_value(bound)),))} {count}")
+            lines.append(f"{self.name}_bucket{_fmt_labels(labels, (('le', '+Inf'),))} {series[len(self.buckets)]}")
+            lines.append(f"{self.name}_sum{_fmt_labels(labels)} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{_fmt_labels(labels)} {series[len(self.buckets)]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value: float = 1, **labels):
+        key = _labels(**labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def total(self, **labels) -> float:
+        """Sum of every series whose labels include `labels`."""
+        want = set(_labels(**labels))
+        with self._lock:
+            return sum(v for k, v in self._values.items() if want <= set(k))
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in items)
+        return lines
+
+
+# ---- the metrics themselves ----
+STAGE_SECONDS = Histogram("studybuddy_stage_seconds", "Time spent per pipeline stage, by route.")
+REQUEST_SECONDS = Histogram("studybuddy_http_request_seconds", "HTTP handler time until the response starts.")
+LLM_TOKENS = Counter("studybuddy_llm_tokens_total", "Tokens reported by completions, by kind and model.")
+LLM_CALLS = Counter("studybuddy_llm_calls_total", "LLM requests by outcome (ok, retry, error, cached, circuit_open).")
+
+_histograms = [STAGE_SECONDS, REQUEST_SECONDS]
+_counters = [LLM_TOKENS, LLM_CALLS]
+
+# callables returning [(name, help, labels dict, value)] read at scrape time
+_gauge_sources: List[Callable[[], Iterable[tuple]]] = []
+
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=stage, route=current_route.get())
+
+
+@contextmanager
+def timed(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def llm_outcome(outcome: str, model: str):
+    LLM_CALLS.inc(outcome=outcome, model=model, route=current_route.get())
+
+
+def record_tokens(model: str, prompt_tokens=None, completion_tokens=None, total_tokens=None):
+    route = current_route.get()
+    for kind, value in (("prompt", prompt_tokens), ("completion", completion_tokens), ("total", total_tokens)):
+        if value:
+            LLM_TOKENS.inc(value, kind=kind, model=model, route=route)
+
+
+def register_gauges(source: Callable[[], Iterable[tuple]]):
+    _gauge_sources.append(source)
+
+
+def render() -> str:
+    lines: List[str] = []
+    for h in _histograms:
+        lines.extend(h.render())
+    for c in _counters:
+        lines.extend(c.render())
+
+    families: Dict[str, tuple] = {}   # name -> (help, samples); samples of a family stay together
+    for source in _gauge_sources:
+        try:
+            gauges = list(source())
+        except Exception:
+            continue
+        for name, help, labels, value in gauges:
+            families.setdefault(name, (help, []))[1].append((labels, value))
+    for name, (help, samples) in families.items():
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.extend(f"{name}{_fmt_labels(_labels(**labels))} {_fmt_value(value)}" for labels, value in samples)
+    return "\n".join(lines) + "\n"
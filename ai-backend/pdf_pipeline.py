@@ -0,0 +1,151 @@
+# pdf_pipeline.py
+"""
+Streaming PDF -> cleaned chunk pipeline used by ai_core.ingest_pdf.
+
+Pages are extracted, split and cleaned in a process pool (a few pages per
+task, with a bounded number of tasks in flight) and the resulting chunks are
+handed to the consumer through a bounded queue, so embedding can start while
+later pages are still being parsed and memory does not grow with the PDF.
+
+This module is imported by the worker processes, so it must stay free of the
+heavy imports in ai_core (model, Chroma, Groq client).
+"""
+import re
+import queue
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Tuple
+
+from pypdf import PdfReader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 100
+PAGES_PER_TASK = 8
+QUEUE_SIZE = 1024      # cleaned chunks buffered between extraction and embedding
+
+
+def clean_text(text: str) -> str:
+    # fix spaced characters like "J o i n"
+    text = re.sub(r'(\b\w\b\s)+\w\b', lambda m: m.group(0).replace(" ", ""), text)
+
+    # remove extra spaces
+    text = re.sub(r'\s+', ' ', text)
+
+    return text.strip()
+
+
+def extract_page_chunks(path: str, start: int, stop: int) -> List[List[str]]:
+    """Cleaned chunks for pages [start, stop), one list per page (may contain "")."""
+    reader = PdfReader(path)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    pages = []
+    for page in reader.pages[start:stop]:
+        pages.append([clean_text(c) for c in splitter.split_text(page.extract_text() or "")])
+    return pages
+
+
+_DONE = object()
+
+
+class PdfChunkStream:
+    """
+    Iterate over (ordinal, cleaned_text) for every chunk of a PDF, in order.
+
+    `ordinal` counts all chunks (including ones that clean to ""), matching the
+    old PyPDFLoader + split_documents numbering. `num_pages` is known up front
+    and `pages_done` advances as pages come off the pool. Call close() when
+    stopping early.
+    """
+
+    def __init__(self, path: str, workers: int = 1, pages_per_task: int = PAGES_PER_TASK,
+                 queue_size: int = QUEUE_SIZE):
+        self.path = path
+        self.num_pages = len(PdfReader(path).pages)
+        self.pages_done = 0
+        self.pages_per_task = pages_per_task
+        tasks = -(-self.num_pages // pages_per_task)
+        self.workers = max(1, min(workers, tasks))
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._produce, daemon=True)
+        self._thread.start()
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _emit(self, pages: List[List[str]], ordinal: int) -> int:
+        for chunks in pages:
+            for text in chunks:
+                if not self._put((ordinal, text)):
+                    return ordinal
+                ordinal += 1
+            self.pages_done += 1
+        return ordinal
+
+    def _produce(self):
+        ordinal = 0
+        ranges = [(s, min(s + self.pages_per_task, self.num_pages))
+                  for s in range(0, self.num_pages, self.pages_per_task)]
+        try:
+            if self.workers == 1:
+                for start, stop in ranges:
+                    if self._stop.is_set():
+                        break
+                    ordinal = self._emit(extract_page_chunks(self.path, start, stop), ordinal)
+            else:
+                # never fork: the server has live threads (uvicorn, torch, the question
+                # bank filler) whose locks a forked child could inherit held
+                with ProcessPoolExecutor(max_workers=self.workers,
+                                         mp_context=multiprocessing.get_context("spawn")) as pool:
+                    pending = deque()
+                    todo = iter(ranges)
+                    # keep a couple of tasks per worker in flight, consume in page order
+                    for start, stop in todo:
+                        pending.append(pool.submit(extract_page_chunks, self.path, start, stop))
+                        if len(pending) >= self.workers * 2:
+                            break
+                    while pending and not self._stop.is_set():
+                        ordinal = self._emit(pending.popleft().result(), ordinal)
+                        nxt = next(todo, None)
+                        if nxt is not None:
+                            pending.append(pool.submit(extract_page_chunks, self.path, *nxt))
+                    for f in pending:
+                        f.cancel()
+        except Exception as e:
+            self._error = e
+        finally:
+            self._put(_DONE)
+
+    def __iter__(self) -> Iterator[Tuple[int, str]]:
+        while True:
+            item = self._queue.get()
+            if item is _DONE:
+                break
+            yield item
+        if self._error is not None:
+            raise self._error
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def default_workers() -> int:
+    """
+    Process count for extraction: 1, i.e. no pool. The pool spawns its workers,
+    and every spawned worker re-imports the launching script, i.e. server.py ->
+    ai_core -> the embedding model; INGEST_WORKERS opts in where that is worth
+    it. A single worker still overlaps extraction (producer thread) with
+    embedding, since torch releases the GIL.
+    """
+    return 1
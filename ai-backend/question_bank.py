@@ -0,0 +1,192 @@
+# question_bank.py
+"""
+Persistent bank of pre-generated MCQs, indexed by the embedding of the chunk
+each question was written from.
+
+ai_core fills it in the background after an ingest (one question per chunk
+per difficulty, up to a per-source target) and /quiz takes questions whose
+chunk is close to the requested topic. Taken questions are marked served
+rather than deleted: they are never handed out again, and their chunk stays
+covered so a refill doesn't write the same question for it a second time.
+Questions passed over (repeats of recent ones) stay for a later quiz.
+
+Rows live in one SQLite file; the embeddings of each difficulty are also
+kept as an in-memory matrix, rebuilt after a write, so a lookup is one
+matrix-vector product.
+"""
+import os
+import time
+import sqlite3
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+OPTION_KEYS = ("a", "b", "c", "d")
+
+
+class QuestionBank:
+    TAKE_POOL = 4   # candidates per wanted question handed to take()'s `accept`
+
+    def __init__(self, path: str, dim: int):
+        self.path = path
+        self.dim = dim
+        self.served = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._matrices: Dict[str, Tuple[np.ndarray, np.ndarray, List[str]]] = {}  # difficulty -> (ids, vectors, sources)
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS questions ("
+            " id INTEGER PRIMARY KEY,"
+            " source TEXT NOT NULL,"
+            " difficulty TEXT NOT NULL,"
+            " chunk_hash TEXT NOT NULL,"
+            " question TEXT NOT NULL,"
+            " a TEXT, b TEXT, c TEXT, d TEXT,"
+            " correct TEXT NOT NULL,"
+            " embedding BLOB NOT NULL,"
+            " created REAL NOT NULL,"
+            " served REAL,"                       # when take() handed it out; NULL = available
+            " UNIQUE (difficulty, chunk_hash))"
+        )
+        columns = {r[1] for r in self._conn.execute("PRAGMA table_info(questions)")}
+        if "served" not in columns:
+            self._conn.execute("ALTER TABLE questions ADD COLUMN served REAL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS questions_source ON questions(source, difficulty)")
+        self._conn.commit()
+
+    def add(self, source: str, difficulty: str, chunk_hash: str, q: dict, vector: Sequence[float]) -> bool:
+        """Store one parsed MCQ; False if this chunk already has a question at this difficulty."""
+        vec = np.asarray(vector, dtype=np.float32)
+        vec = vec / (np.linalg.norm(vec) or 1.0)
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO questions "
+                "(source, difficulty, chunk_hash, question, a, b, c, d, correct, embedding, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (source, difficulty, chunk_hash, q["question"], *(q[k] for k in OPTION_KEYS),
+                 q["correct"], vec.tobytes(), time.time()),
+            )
+            self._conn.commit()
+            self._matrices.pop(difficulty, None)
+            return cur.rowcount > 0
+
+    def covered(self, source: str, difficulty: str) -> Set[str]:
+        """Chunk hashes of `source` that already have a question at `difficulty`, served or not."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_hash FROM questions WHERE source = ? AND difficulty = ?", (source, difficulty)
+            ).fetchall()
+        return {r[0] for r in rows}
+
+    def available(self, source: str, difficulty: str) -> int:
+        """How many questions of `source` at `difficulty` are waiting to be served."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM questions WHERE source = ? AND difficulty = ? AND served IS NULL",
+                (source, difficulty),
+            ).fetchone()[0]
+
+    def questions(self, source: str, difficulty: str) -> List[str]:
+        """Question texts of `source` at `difficulty`, served ones included."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT question FROM questions WHERE source = ? AND difficulty = ? ORDER BY id",
+                (source, difficulty),
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def prune(self, source: str, keep_hashes: Set[str]) -> int:
+        """Drop questions of `source` whose chunk is no longer stored; returns how many."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, chunk_hash FROM questions WHERE source = ?", (source,)
+            ).fetchall()
+            gone = [(id_,) for id_, h in rows if h not in keep_hashes]
+            if gone:
+                self._conn.executemany("DELETE FROM questions WHERE id = ?", gone)
+                self._conn.commit()
+                self._matrices.clear()
+        return len(gone)
+
+    def _matrix(self, difficulty: str) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+        # caller holds the lock
+        cached = self._matrices.get(difficulty)
+        if cached is None:
+            rows = self._conn.execute(
+                "SELECT id, source, embedding FROM questions WHERE difficulty = ? AND served IS NULL", (difficulty,)
+            ).fetchall()
+            ids = np.array([r[0] for r in rows], dtype=np.int64)
+            vectors = np.frombuffer(b"".join(r[2] for r in rows), dtype=np.float32).reshape(len(rows), self.dim)
+            cached = self._matrices[difficulty] = (ids, vectors, [r[1] for r in rows])
+        return cached
+
+    def take(self, vector: Sequence[float], difficulty: str, n: int, min_score: float,
+             exclude: Optional[Sequence[str]] = None,
+             accept: Optional[Callable[[List[dict]], List[bool]]] = None) -> List[Tuple[str, dict]]:
+        """
+        Mark served and return up to `n` (source, question) pairs at `difficulty`
+        whose chunk has cosine >= `min_score` with `vector`, best match first.
+        Questions whose text is in `exclude` are skipped, and so are those
+        `accept` (called with up to TAKE_POOL * n candidates, outside the lock)
+        flags False; skipped questions stay in the bank.
+        """
+        q = np.asarray(vector, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        skip = {t.strip().lower() for t in exclude or []}
+        with self._lock:
+            ids, vectors, sources = self._matrix(difficulty)
+            scores = vectors @ q if len(ids) else np.zeros(0, dtype=np.float32)
+            order = [int(i) for i in np.argsort(-scores) if scores[i] >= min_score]
+
+            candidates = []
+            for i in order:
+                if len(candidates) >= n * (self.TAKE_POOL if accept else 1):
+                    break
+                row = self._conn.execute(
+                    "SELECT question, a, b, c, d, correct FROM questions WHERE id = ? AND served IS NULL",
+                    (int(ids[i]),)
+                ).fetchone()
+                if row is None or row[0].strip().lower() in skip:
+                    continue
+                skip.add(row[0].strip().lower())
+                candidates.append((int(ids[i]), sources[i], dict(zip(("question",) + OPTION_KEYS + ("correct",), row))))
+
+        if accept and candidates:
+            verdicts = accept([q for _, _, q in candidates])
+            candidates = [c for c, ok in zip(candidates, verdicts) if ok]
+
+        taken = []
+        now = time.time()
+        with self._lock:
+            for id_, source, question in candidates:
+                if len(taken) >= n:
+                    break
+                # another taker may have claimed it while `accept` ran
+                if self._conn.execute("UPDATE questions SET served = ? WHERE id = ? AND served IS NULL",
+                                      (now, id_)).rowcount:
+                    taken.append((source, question))
+            if taken:
+                self._conn.commit()
+                self._matrices.pop(difficulty, None)
+            self.served += len(taken)
+            self.misses += n - len(taken)
+        return taken
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM questions")
+            self._conn.commit()
+            self._matrices.clear()
+
+    # questions still available; served ones only keep their chunk covered
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM questions WHERE served IS NULL").fetchone()[0]
+
+    def stats(self) -> dict:
+        return {"entries": len(self), "served": self.served, "misses": self.misses}
@@ -0,0 +1,73 @@
+# quiz_planner.py
+"""
+Split one retrieved candidate pool into per-question context slices.
+
+A quiz retrieves a pool of ~3 chunks per question once, clusters the chunk
+embeddings with spherical k-means (one cluster per question) and gives each
+question the chunks of its own cluster. Questions then see different parts
+of the notes instead of the same top-6 chunks, and each prompt carries only
+`per_slice` chunks.
+
+Everything is deterministic for a given pool: initial centroids are picked
+farthest-first starting from the best-ranked chunk.
+"""
+from typing import List
+
+import numpy as np
+
+
+def _normalize(vectors) -> np.ndarray:
+    x = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.where(norms == 0, 1, norms)
+
+
+def kmeans(vectors, k: int, iters: int = 20) -> np.ndarray:
+    """Spherical k-means on the rows of `vectors`; returns a cluster label per row."""
+    x = _normalize(vectors)
+    k = max(1, min(k, len(x)))
+
+    # farthest-first init: rank 0, then whichever row is least similar to every centroid so far
+    centers = [0]
+    closest = x @ x[0]
+    while len(centers) < k:
+        nxt = int(np.argmin(closest))
+        centers.append(nxt)
+        closest = np.maximum(closest, x @ x[nxt])
+    centroids = x[centers].copy()
+
+    labels = np.full(len(x), -1)
+    for _ in range(iters):
+        sims = x @ centroids.T
+        new = np.argmax(sims, axis=1)
+        # empty clusters take the rows that fit their own cluster worst
+        worst_first = iter(np.argsort(sims[np.arange(len(x)), new]))
+        for c in range(k):
+            while not np.any(new == c):
+                row = int(next(worst_first))
+                if np.count_nonzero(new == new[row]) > 1:
+                    new[row] = c
+        if np.array_equal(new, labels):
+            break
+        labels = new
+        for c in range(k):
+            centroid = x[labels == c].sum(axis=0)
+            centroids[c] = centroid / (np.linalg.norm(centroid) or 1.0)
+    return labels
+
+
+def partition(vectors, n: int, per_slice: int = 3) -> List[List[int]]:
+    """
+    Row indices for up to `n` distinct context slices. Rows are assumed to be in
+    retrieval rank order; each slice keeps its cluster's `per_slice` best-ranked
+    rows and slices are ordered by their best row. With fewer rows than `n`,
+    fewer slices come back (see ai_core.quiz_slots for sharing them).
+    """
+    if n <= 0 or len(vectors) == 0:
+        return []
+    labels = kmeans(vectors, n)
+    clusters = {}
+    for row, label in enumerate(labels):          # rows arrive in rank order
+        clusters.setdefault(int(label), []).append(row)
+    slices = sorted((rows[:per_slice] for rows in clusters.values()), key=lambda rows: rows[0])
+    return slices
@@ -0,0 +1,196 @@
+# rate_limiter.py
+"""
+Process-wide rate limiter for Groq calls.
+
+Two continuously refilling token buckets (requests/minute and tokens/minute)
+gate every call. Callers that have to wait are served in (priority, arrival)
+order, so an interactive doubt jumps ahead of a background summary, and no
+delay at all is added while the quota has room. Limits and remaining budget
+are corrected from the x-ratelimit-* response headers.
+"""
+import re
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+from typing import Mapping, Optional
+
+PRIORITY_INTERACTIVE = 0   # /doubt
+PRIORITY_NORMAL = 1        # quiz generation
+PRIORITY_BACKGROUND = 2    # summaries, pre-generation
+
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """Parse Groq reset durations like '2m59.56s', '7.66s', '250ms' into seconds."""
+    if not value:
+        return None
+    total = 0.0
+    matched = False
+    for num, unit in re.findall(r"([\d.]+)\s*(ms|h|m|s)", value):
+        matched = True
+        total += float(num) * {"h": 3600, "m": 60, "s": 1, "ms": 0.001}[unit]
+    if matched:
+        return total
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+class RateLimiter:
+    def __init__(self, requests_per_minute: float = 30, tokens_per_minute: float = 6000):
+        self.rpm = float(requests_per_minute)
+        self.tpm = float(tokens_per_minute)
+        self._requests = self.rpm
+        self._tokens = self.tpm
+        self._blocked_until = 0.0        # daily request quota exhausted
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+        self._waiters: list = []
+        self._seq = itertools.count()
+        self.calls = 0
+        self.waited_calls = 0
+        self.wait_seconds = 0.0
+
+    # ---- bucket maths (caller holds the lock) ----
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60.0)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60.0)
+
+    def _wait_for(self, tokens: float) -> float:
+        waits = [max(0.0, self._blocked_until - time.monotonic())]
+        if self._requests < 1:
+            waits.append((1 - self._requests) * 60.0 / self.rpm)
+        if self._tokens < tokens:
+            waits.append((tokens - self._tokens) * 60.0 / self.tpm)
+        return max(waits)
+
+    def _try_take(self, ticket, tokens: float) -> float:
+        """Take budget for `ticket` if it is first in line; returns 0 or seconds to wait."""
+        self._refill()
+        if self._waiters[0] != ticket:
+            return -1.0
+        wait = self._wait_for(tokens)
+        if wait > 0:
+            return wait
+        heapq.heappop(self._waiters)
+        self._requests -= 1
+        self._tokens -= tokens
+        self._cond.notify_all()
+        return 0.0
+
+    def _leave(self, ticket):
+        if ticket in self._waiters:
+            self._waiters.remove(ticket)
+            heapq.heapify(self._waiters)
+            self._cond.notify_all()
+
+    def _account(self, waited: float):
+        self.calls += 1
+        if waited > 0.001:
+            self.waited_calls += 1
+            self.wait_seconds += waited
+
+    # ---- public API ----
+    def acquire(self, tokens: float, priority: int = PRIORITY_NORMAL) -> float:
+        """Block until the call fits the quota; returns seconds spent waiting."""
+        tokens = min(tokens, self.tpm)
+        started = time.monotonic()
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    wait = self._try_take(ticket, tokens)
+                    if wait == 0:
+                        break
+                    # not first in line: sleep until the head takes its turn
+                    self._cond.wait(timeout=wait if wait > 0 else None)
+            except BaseException:
+                self._leave(ticket)
+                raise
+            waited = time.monotonic() - started
+            self._account(waited)
+            return waited
+
+    async def acquire_async(self, tokens: float, priority: int = PRIORITY_NORMAL) -> float:
+        """asyncio flavour of acquire(): same buckets and queue, never blocks the loop."""
+        tokens = min(tokens, self.tpm)
+        started = time.monotonic()
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiters, ticket)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_take(ticket, tokens)
+                if wait == 0:
+                    break
+                # not first in line: poll until the head takes its turn
+                await asyncio.sleep(min(wait, 0.25) if wait > 0 else 0.02)
+        except BaseException:
+            with self._cond:
+                self._leave(ticket)
+            raise
+        waited = time.monotonic() - started
+        with self._cond:
+            self._account(waited)
+        return waited
+
+    def pause(self, seconds: float):
+        """Hold every caller for `seconds`, e.g. the Retry-After of a 429."""
+        with self._cond:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def record_usage(self, estimated: float, actual: Optional[float]):
+        """Refund (or charge) the difference between estimated and real token use."""
+        if actual is None:
+            return
+        with self._cond:
+            self._tokens = min(self.tpm, self._tokens + (min(estimated, self.tpm) - actual))
+            self._cond.notify_all()
+
+    def update_from_headers(self, headers: Optional[Mapping[str, str]]):
+        """
+        Learn from Groq's headers: x-ratelimit-limit-tokens is the TPM limit,
+        remaining-tokens the live TPM budget; the *-requests pair is the daily
+        request quota, so only its exhaustion (remaining 0) blocks us.
+        """
+        if not headers:
+            return
+        get = lambda k: headers.get(k) or headers.get(k.title())
+        with self._cond:
+            self._refill()
+            try:
+                limit = get("x-ratelimit-limit-tokens")
+                if limit:
+                    self.tpm = float(limit)
+                remaining = get("x-ratelimit-remaining-tokens")
+                if remaining is not None:
+                    self._tokens = min(self._tokens, float(remaining))
+                if get("x-ratelimit-remaining-requests") == "0":
+                    reset = parse_reset(get("x-ratelimit-reset-requests"))
+                    if reset:
+                        self._blocked_until = time.monotonic() + reset
+            except ValueError:
+                pass
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            self._refill()
+            return {
+                "rpm": self.rpm,
+                "tpm": self.tpm,
+                "requests_available": round(self._requests, 2),
+                "tokens_available": round(self._tokens, 1),
+                "queued": len(self._waiters),
+                "calls": self.calls,
+                "waited_calls": self.waited_calls,
+                "wait_seconds": round(self.wait_seconds, 3),
+            }
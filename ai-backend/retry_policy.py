@@ -0,0 +1,183 @@
+# retry_policy.py
+"""
+Retry classification, backoff and a circuit breaker for LLM calls.
+
+RetryPolicy.decide(error, attempt) looks at the HTTP status of a failed call:
+    429                  retry after Retry-After (or the x-ratelimit reset
+                         headers); the caller also pauses its rate limiter
+    408, 409, 5xx        retry with exponential backoff + full jitter
+    network / timeout    same as 5xx
+    other 4xx / errors   no retry: the request itself is wrong
+
+5xx and network failures count against the CircuitBreaker. After
+`failure_threshold` of them in a row it opens and calls fail immediately for
+`reset_timeout` seconds, then one trial call is let through (half-open): a
+success closes it again, a failure re-opens it.
+"""
+import time
+import random
+import threading
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from rate_limiter import parse_reset
+
+RETRYABLE_STATUS = {408, 409}
+
+
+@dataclass
+class RetryDecision:
+    retry: bool
+    delay: float = 0.0
+    provider_failure: bool = False       # counts against the circuit breaker
+    retry_after: Optional[float] = None  # server-mandated pause, seconds
+    reason: str = ""
+
+
+def status_of(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def retry_after_of(error: BaseException) -> Optional[float]:
+    """Seconds from Retry-After (delta or HTTP date), else Groq's reset headers."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    resets = [parse_reset(headers.get(h)) for h in ("x-ratelimit-reset-tokens", "x-ratelimit-reset-requests")]
+    resets = [r for r in resets if r is not None]
+    return min(resets) if resets else None
+
+
+def _is_network_error(error: BaseException) -> bool:
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    # SDK errors (APIConnectionError, APITimeoutError, httpx.TransportError, ...)
+    names = {cls.__name__ for cls in type(error).__mro__}
+    return any(n.endswith(("ConnectionError", "TimeoutError", "TransportError")) for n in names)
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int = 4, base_delay: float = 0.5, max_delay: float = 8.0,
+                 max_retry_after: float = 30.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    def backoff(self, attempt: int, base_delay: Optional[float] = None) -> float:
+        """Full jitter: uniform(0, min(max_delay, base * 2**attempt))."""
+        base = self.base_delay if base_delay is None else base_delay
+        return random.uniform(0, min(self.max_delay, base * (2 ** attempt)))
+
+    def decide(self, error: BaseException, attempt: int, max_attempts: Optional[int] = None,
+               base_delay: Optional[float] = None) -> RetryDecision:
+        """What to do after `error` on zero-based `attempt`."""
+        attempts = self.max_attempts if max_attempts is None else max_attempts
+        last = attempt >= attempts - 1
+        status = status_of(error)
+
+        if status == 429:
+            wait = retry_after_of(error)
+            if wait is None:
+                wait = self.backoff(attempt, base_delay)
+            if last or wait > self.max_retry_after:
+                return RetryDecision(False, retry_after=wait, reason="rate_limited")
+            # a little jitter so everyone released by the same reset doesn't collide
+            return RetryDecision(True, wait + random.uniform(0, 0.25), retry_after=wait, reason="rate_limited")
+
+        if status is not None and (status >= 500 or status in RETRYABLE_STATUS):
+            return RetryDecision(not last, self.backoff(attempt, base_delay),
+                                 provider_failure=status >= 500, reason=f"http_{status}")
+
+        if status is None and _is_network_error(error):
+            return RetryDecision(not last, self.backoff(attempt, base_delay),
+                                 provider_failure=True, reason="network")
+
+        return RetryDecision(False, reason=f"http_{status}" if status else type(error).__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the provider while the breaker is open."""
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._trial_started = 0.0
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        now = time.monotonic()
+        if self._state == self.OPEN and now - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+        elif self._state == self.HALF_OPEN and self._trial_in_flight and now - self._trial_started >= self.reset_timeout:
+            # the trial never reported back (cancelled caller); let another one through
+            self._trial_in_flight = False
+        return self._state
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go out now."""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                self._trial_started = time.monotonic()
+                return
+            self.rejected += 1
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+            raise CircuitOpenError(f"LLM provider unavailable, circuit open (retry in {retry_in:.0f}s)")
+
+    def record(self, provider_failure: bool):
+        """Report how a call that passed before_call() ended."""
+        with self._lock:
+            if not provider_failure:
+                self._state = self.CLOSED
+                self._failures = 0
+                self._trial_in_flight = False
+                return
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self._failures,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
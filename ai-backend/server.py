@@ -2,8 +2,13 @@
 import os
 from typing import List, Optional
 import uuid
+import json
+import time
+import asyncio
 import threading
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.routing import Match
 from pydantic import BaseModel
 import numpy as np
 from pydantic import BaseModel
@@ -14,24 +19,68 @@ import os
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from Emotion_Behavior.attentiveORdistracted_copy import run_attentiveness_check
+import metrics
                 
 jobs = {}
+quiz_sessions = {}
+
+QUIZ_SESSION_TTL = 30 * 60    # seconds a session is kept after it was last fetched from
+QUIZ_SESSION_WAIT = 60        # longest a fetch waits for the next question
+QUIZ_MAX_QUESTIONS = 20       # per request; each one costs an LLM call (or a share of one)
 
 from ai_core import (
-    generate_single_question,
+    astream_quiz_questions,
+    agenerate_single_question,
+    aplan_quiz_contexts,
+    quiz_slots,
+    atake_bank_questions,
+    agenerate_questions_batch,
+    agenerate_questions_fanout,
     check_answer,
-    solve_doubt,
+    asolve_doubt,
+    astream_doubt,
     summarize_notes,
+    astream_summary,
     ingest_pdf,
+    IngestCancelled,
 )
 
 app = FastAPI(title="StudyBuddy AI Backend")
 
 
+def route_template(request: Request) -> str:
+    # "/ingest/status/{job_id}" rather than the raw path, to keep label cardinality low
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    route = route_template(request)
+    metrics.current_route.set(route)
+    status = 500
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started,
+                                        route=route, method=request.method, status=status)
+
+
 class QuizRequest(BaseModel):
     topic: str
     difficulty: str = "Medium"
     num_questions: int = 5
+    # "batch": one completion for the whole quiz; "fanout": one concurrent call per
+    # context slice; "serial": one call per question, in order
+    mode: str = "batch"
+    # questions the user saw recently; paraphrases of them are rejected
+    recent_questions: List[str] = []
 
 
 class CheckAnswerRequest(BaseModel):
@@ -56,7 +105,34 @@ class AnalysticsRequest(BaseModel):
     quiz_history:List[dict]
     emotion_history:List[dict]
 
+def sse_stream(deltas):
+    """
+    Wrap an async iterator of text deltas as Server-Sent Events:
+    "token" per delta, then "done" with the full text (or "error").
+    """
+    async def events():
+        parts = []
+        try:
+            async for delta in deltas:
+                if delta.lstrip().startswith("ERROR_IN_GROQ"):
+                    yield f"event: error\ndata: {json.dumps({'error': delta.strip()})}\n\n"
+                    return
+                parts.append(delta)
+                yield f"event: token\ndata: {json.dumps({'text': delta})}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+            return
+        yield f"event: done\ndata: {json.dumps({'text': ''.join(parts)})}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 def run_summary(job_id: str, mode: str, source: str):
+    metrics.current_route.set("/summarize/start")
     try:
         result = summarize_notes(mode, source)
         jobs[job_id] = {"status": "done", "result": result}
@@ -64,54 +140,275 @@ def run_summary(job_id: str, mode: str, source: str):
         jobs[job_id] = {"status": "error", "result": str(e)}
 
 
+def run_ingest(job_id: str, path: str, cancel_event: threading.Event):
+    job = jobs[job_id]
+    metrics.current_route.set("/ingest/start")
+    try:
+        added = ingest_pdf(path, progress=job["progress"].update, cancel_event=cancel_event)
+        job.update(status="done", result=added)
+    except IngestCancelled:
+        job.update(status="cancelled", result="")
+    except Exception as e:
+        job.update(status="error", result=str(e))
+
+
 @app.get("/health")
-def health():
+async def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/ingest")
 def ingest(req: IngestRequest):
     pages = ingest_pdf(req.path)
     return {"ok": True, "pages": pages, "path": req.path}
 
 
-@app.post("/quiz")
-def quiz(req: QuizRequest):
-    if req.difficulty not in ["Easy", "Medium", "Hard"]:
-        return {"ok": False, "error": "Invalid difficulty"}
+@app.post("/ingest/start")
+async def ingest_start(req: IngestRequest):
+    if not os.path.exists(req.path):
+        return {"ok": False, "error": f"PDF not found: {req.path}"}
+
+    job_id = str(uuid.uuid4())
+    cancel_event = threading.Event()
+    jobs[job_id] = {
+        "status": "processing",
+        "result": "",
+        "path": req.path,
+        "progress": {},
+        "cancel": cancel_event,
+    }
+
+    t = threading.Thread(target=run_ingest, args=(job_id, req.path, cancel_event), daemon=True)
+    t.start()
+
+    return {"ok": True, "job_id": job_id}
+
+
+@app.get("/ingest/status/{job_id}")
+async def ingest_status(job_id: str):
+    job = jobs.get(job_id)
+    if not job or "cancel" not in job:
+        return {"ok": False, "error": "Invalid job_id"}
+
+    body = {"ok": True, "status": job["status"], "path": job["path"], **job["progress"]}
+    if job["status"] == "done":
+        body["pages"] = job["result"]
+    elif job["status"] == "error":
+        body.update(ok=False, error=job["result"])
+    return body
+
 
+@app.post("/ingest/cancel/{job_id}")
+async def ingest_cancel(job_id: str):
+    job = jobs.get(job_id)
+    if not job or "cancel" not in job:
+        return {"ok": False, "error": "Invalid job_id"}
+
+    job["cancel"].set()
+    return {"ok": True, "status": job["status"]}
+
+
+def quiz_request_error(req: QuizRequest) -> Optional[str]:
+    if req.difficulty not in ["Easy", "Medium", "Hard"]:
+        return "Invalid difficulty"
     if len(req.topic.strip()) < 2:
-        return {"ok": False, "error": "Topic too short"}
+        return "Topic too short"
+    if not 1 <= req.num_questions <= QUIZ_MAX_QUESTIONS:
+        return f"num_questions must be between 1 and {QUIZ_MAX_QUESTIONS}"
+    if req.mode not in ["batch", "fanout", "serial"]:
+        return "Invalid mode"
+    return None
 
-    used_questions = []
-    questions = []
 
-    for _ in range(req.num_questions):
-        q = generate_single_question(req.topic, req.difficulty, used_questions)
-        if q:
-            used_questions.append(q["question"].strip())
-            questions.append(q)
+@app.post("/quiz")
+async def quiz(req: QuizRequest):
+    error = quiz_request_error(req)
+    if error:
+        return {"ok": False, "error": error}
+
+    # pre-generated questions first; only what the bank can't match is generated live
+    recent = [t.strip() for t in req.recent_questions if t.strip()]
+    questions = await atake_bank_questions(req.topic, req.difficulty, req.num_questions, recent)
+    from_bank = len(questions)
+    used_questions = recent + [q["question"].strip() for q in questions]
+    missing = req.num_questions - from_bank
+
+    if missing > 0 and req.mode == "batch":
+        questions += await agenerate_questions_batch(req.topic, req.difficulty, missing, used_questions)
+    elif missing > 0 and req.mode == "fanout":
+        questions += await agenerate_questions_fanout(req.topic, req.difficulty, missing, used_questions)
+    elif missing > 0:
+        # one retrieval for the quiz; each question gets its own slice of it
+        for context, angle in quiz_slots(await aplan_quiz_contexts(req.topic, missing), missing):
+            q = await agenerate_single_question(req.topic, req.difficulty, used_questions,
+                                                context=context, angle=angle)
+            if q:
+                used_questions.append(q["question"].strip())
+                questions.append(q)
 
     if not questions:
         return {"ok": False, "error": "No questions could be generated"}
 
-    return {"ok": True, "questions": questions}
+    return {"ok": True, "questions": questions, "from_bank": from_bank}
 
 
 @app.post("/quiz/check")
-def quiz_check(req: CheckAnswerRequest):
+async def quiz_check(req: CheckAnswerRequest):
     correct = check_answer(req.question_data, req.user_answer)
     return {"ok": True, "correct": correct}
 
 
+# --------- QUIZ SESSIONS ----------
+# POST /quiz/session answers with the first question as soon as it exists; the
+# rest are produced in the background and fetched one by one
+# (GET /quiz/session/{id}/{index}) or pushed as SSE (GET /quiz/session/{id}/stream).
+# A fetch that gives up waiting answers "pending": true; ask for the same index again.
+
+def expire_quiz_sessions() -> None:
+    # finished or abandoned: nobody has asked for anything in QUIZ_SESSION_TTL
+    now = time.time()
+    for sid in [sid for sid, s in quiz_sessions.items() if now - s["touched_at"] > QUIZ_SESSION_TTL]:
+        session = quiz_sessions.pop(sid)
+        if not session["done"]:
+            session["task"].cancel()
+
+
+def get_quiz_session(session_id: str) -> Optional[dict]:
+    session = quiz_sessions.get(session_id)
+    if session:
+        session["touched_at"] = time.time()
+    return session
+
+
+async def run_quiz_session(session: dict, req: QuizRequest, recent: List[str]):
+    try:
+        async for q in astream_quiz_questions(req.topic, req.difficulty, req.num_questions, recent):
+            session["questions"].append(q)
+            async with session["cond"]:
+                session["cond"].notify_all()
+    except Exception as e:
+        session["error"] = str(e)
+    finally:
+        session["done"] = True
+        async with session["cond"]:
+            session["cond"].notify_all()
+
+
+async def wait_for_question(session: dict, index: int) -> None:
+    """Until question `index` exists, the session is done, or QUIZ_SESSION_WAIT passes."""
+    cond = session["cond"]
+    try:
+        async with cond:
+            await asyncio.wait_for(
+                cond.wait_for(lambda: len(session["questions"]) > index or session["done"]),
+                QUIZ_SESSION_WAIT,
+            )
+    except asyncio.TimeoutError:
+        pass
+
+
+def session_question(session_id: str, session: dict, index: int) -> dict:
+    questions = session["questions"]
+    body = {
+        "ok": True,
+        "session_id": session_id,
+        "index": index,
+        "total": session["total"],
+        "question": questions[index] if index < len(questions) else None,
+        # nothing at or after `index` will ever arrive
+        "done": session["done"] and index + 1 >= len(questions),
+    }
+    # still being generated (e.g. behind a rate-limit pause): fetch `index` again
+    body["pending"] = body["question"] is None and not session["done"]
+    if session["error"] and body["question"] is None:
+        body["error"] = session["error"]
+    return body
+
+
+@app.post("/quiz/session")
+async def quiz_session_start(req: QuizRequest):
+    error = quiz_request_error(req)
+    if error:
+        return {"ok": False, "error": error}
+
+    expire_quiz_sessions()
+
+    session_id = str(uuid.uuid4())
+    session = quiz_sessions[session_id] = {
+        "questions": [],
+        "total": req.num_questions,
+        "done": False,
+        "error": None,
+        "touched_at": time.time(),
+        "cond": asyncio.Condition(),
+    }
+    recent = [t.strip() for t in req.recent_questions if t.strip()]
+    session["task"] = asyncio.create_task(run_quiz_session(session, req, recent))
+
+    await wait_for_question(session, 0)
+    body = session_question(session_id, session, 0)
+    if body["question"] is None and session["done"]:
+        return {"ok": False, "error": session["error"] or "No questions could be generated"}
+    return body
+
+
+@app.get("/quiz/session/{session_id}/stream")
+async def quiz_session_stream(session_id: str):
+    session = get_quiz_session(session_id)
+    if not session:
+        return {"ok": False, "error": "Invalid session_id"}
+
+    async def events():
+        index = 0
+        while True:
+            await wait_for_question(session, index)
+            session["touched_at"] = time.time()
+            if index < len(session["questions"]):
+                payload = {"index": index, "question": session["questions"][index]}
+                yield f"event: question\ndata: {json.dumps(payload)}\n\n"
+                index += 1
+            elif session["done"]:
+                break
+        payload = {"count": len(session["questions"]), "error": session["error"]}
+        yield f"event: done\ndata: {json.dumps(payload)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/quiz/session/{session_id}/{index}")
+async def quiz_session_question(session_id: str, index: int):
+    session = get_quiz_session(session_id)
+    if not session:
+        return {"ok": False, "error": "Invalid session_id"}
+    if index < 0:
+        return {"ok": False, "error": "Invalid index"}
+
+    await wait_for_question(session, index)
+    return session_question(session_id, session, index)
+
+
 @app.post("/doubt")
-def doubt(req: DoubtRequest):
-    answer = solve_doubt(req.question, last_answer=req.last_answer or "")
+async def doubt(req: DoubtRequest):
+    answer = await asolve_doubt(req.question, last_answer=req.last_answer or "")
     return {"ok": True, "answer": answer}
 
 
+@app.post("/doubt/stream")
+async def doubt_stream(req: DoubtRequest):
+    return sse_stream(astream_doubt(req.question, last_answer=req.last_answer or ""))
+
+
 @app.post("/summarize/start")
-def summarize_start(req: SummaryRequest):
+async def summarize_start(req: SummaryRequest):
     mode = "Brief" if req.mode.lower().startswith("brief") else "Detailed"
     job_id = str(uuid.uuid4())
     jobs[job_id] = {"status": "processing", "result": ""}
@@ -122,8 +419,14 @@ def summarize_start(req: SummaryRequest):
     return {"ok": True, "job_id": job_id}
 
 
+@app.post("/summarize/stream")
+async def summarize_stream(req: SummaryRequest):
+    mode = "Brief" if req.mode.lower().startswith("brief") else "Detailed"
+    return sse_stream(astream_summary(mode, req.source))
+
+
 @app.get("/summarize/status/{job_id}")
-def summarize_status(job_id: str):
+async def summarize_status(job_id: str):
     job = jobs.get(job_id)
     if not job:
         return {"ok": False, "error": "Invalid job_id"}
@@ -135,12 +438,16 @@ def summarize_status(job_id: str):
         return {"ok": False, "status": "error", "error": job["result"]}
 
     return {"ok": True, "status": "processing"}
+# webcam capture + model inference block, so this stays a sync (threadpool) route
 @app.post("/attentive")
 def run_attentive():
-    return { "ok": True, **run_attentiveness_check() }
+    result = run_attentiveness_check()
+    for stage, seconds in result.get("timings", {}).items():
+        metrics.observe_stage(stage, seconds)
+    return { "ok": True, **result }
 
 @app.post("/analytics")
-def compute_analytics(req:AnalysticsRequest):
+async def compute_analytics(req:AnalysticsRequest):
     sessions=req.sessions
     quiz_history=req.quiz_history
     emotion_history=req.emotion_history
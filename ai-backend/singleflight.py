@@ -0,0 +1,110 @@
+# singleflight.py
+"""
+Request coalescing: concurrent calls with the same key share one execution.
+
+The first caller for a key runs the work; callers arriving while it is in
+flight wait for it and get the same result (or the same exception). Nothing
+is remembered once the call finishes, so this complements the caches rather
+than replacing them. An asyncio call is cancelled once every caller waiting
+on it has been cancelled.
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Future"):
+        self.task = task
+        self.waiters = 1
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}          # key -> _Call (threads)
+        self._tasks = {}          # (loop, key) -> _Flight
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run fn() unless a call for `key` is in flight; then wait for and share its result."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """asyncio flavour of do(): fn() is a coroutine function, shared per event loop."""
+        task_key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            flight = self._tasks.get(task_key)
+            if flight is not None:
+                flight.waiters += 1
+                self.coalesced += 1
+            else:
+                flight = self._tasks[task_key] = _Flight(asyncio.ensure_future(fn()))
+                self.executed += 1
+                flight.task.add_done_callback(lambda _t: self._forget(task_key, flight))
+        try:
+            # shield: one cancelled waiter must not cancel the call the others share
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            with self._lock:
+                flight.waiters -= 1
+                abandoned = flight.waiters == 0
+                if abandoned:
+                    # nobody is left to use the result; new callers start afresh
+                    self._forget_locked(task_key, flight)
+            if abandoned:
+                flight.task.cancel()
+            raise
+
+    def _forget(self, task_key, flight):
+        with self._lock:
+            self._forget_locked(task_key, flight)
+
+    def _forget_locked(self, task_key, flight):
+        if self._tasks.get(task_key) is flight:
+            del self._tasks[task_key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls) + len(self._tasks),
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+            }
@@ -0,0 +1,306 @@
+# vector_index.py
+"""
+Vector store backends used by ai_core.
+
+Both backends expose the same small surface:
+    existing_hashes(hashes) -> set      which doc_hash values are stored
+    add(ids, vectors, texts, metadatas)
+    delete_hashes(hashes)
+    search(vector, k, source=None) -> [(text, metadata), ...]   best first
+    iter_documents(source=None, limit=None, page_size) -> (text, metadata)
+                                        in stable (source, page) order
+    iter_rows(page_size) -> (id, text, metadata, vector) for every row
+    count() / persist()
+
+ChromaBackend wraps the langchain Chroma store. NumpyVectorIndex keeps
+L2-normalised vectors in one contiguous float32/float16 matrix (loaded
+memory-mapped) and answers top-k exactly with a matrix-vector product and
+argpartition, which beats the SQLite + HNSW round trip for the few-thousand
+chunk corpora a student has.
+"""
+import os
+import json
+import threading
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+HASH_LOOKUP_PAGE = 500    # doc_hash values resolved per metadata lookup
+DOC_PAGE_SIZE = 200       # documents fetched per page by iter_documents
+
+
+def _doc_order(meta: dict, id_: str):
+    return (meta.get("source") or "", meta.get("page") or 0, id_)
+
+
+class ChromaBackend:
+    def __init__(self, store):
+        self.store = store
+
+    @property
+    def _collection(self):
+        return self.store._collection
+
+    def existing_hashes(self, hashes: Sequence[str]) -> set:
+        found = set()
+        for start in range(0, len(hashes), HASH_LOOKUP_PAGE):
+            page = list(hashes[start:start + HASH_LOOKUP_PAGE])
+            search = self._collection.get(
+                where={"doc_hash": {"$in": page}},
+                include=["metadatas"]
+            )
+            for meta in (search or {}).get("metadatas") or []:
+                if meta and meta.get("doc_hash"):
+                    found.add(meta["doc_hash"])
+        return found
+
+    def add(self, ids: List[str], vectors: List[List[float]], texts: List[str], metadatas: List[dict]):
+        self._collection.add(ids=ids, embeddings=vectors, documents=texts, metadatas=metadatas)
+
+    def delete_hashes(self, hashes: Sequence[str]):
+        for start in range(0, len(hashes), HASH_LOOKUP_PAGE):
+            page = list(hashes[start:start + HASH_LOOKUP_PAGE])
+            self._collection.delete(where={"doc_hash": {"$in": page}})
+
+    def search(self, vector: Sequence[float], k: int, source: Optional[str] = None) -> List[Tuple[str, dict]]:
+        docs = self.store.similarity_search_by_vector(
+            list(vector),
+            k=k,
+            filter={"source": source} if source else None
+        )
+        return [(d.page_content, d.metadata) for d in docs]
+
+    def iter_documents(self, source: Optional[str] = None, limit: Optional[int] = None,
+                       page_size: int = DOC_PAGE_SIZE) -> Iterator[Tuple[str, dict]]:
+        # pass 1: metadata only (small) to establish the order
+        where = {"source": source} if source else None
+        keys = []
+        offset = 0
+        while True:
+            data = self._collection.get(where=where, include=["metadatas"], limit=1000, offset=offset)
+            ids = data.get("ids") or []
+            if not ids:
+                break
+            keys.extend(_doc_order(m or {}, i) for i, m in zip(ids, data["metadatas"]))
+            offset += len(ids)
+        keys.sort()
+        if limit is not None:
+            keys = keys[:limit]
+
+        # pass 2: documents, one page of ids at a time
+        for start in range(0, len(keys), page_size):
+            page_ids = [k[2] for k in keys[start:start + page_size]]
+            data = self._collection.get(ids=page_ids, include=["documents", "metadatas"])
+            rows = {i: (d, m) for i, d, m in zip(data["ids"], data["documents"], data["metadatas"])}
+            for i in page_ids:
+                if i in rows:
+                    yield rows[i]
+
+    def iter_rows(self, page_size: int = 1000) -> Iterator[Tuple[str, str, dict, List[float]]]:
+        offset = 0
+        while True:
+            data = self._collection.get(
+                include=["documents", "metadatas", "embeddings"],
+                limit=page_size,
+                offset=offset
+            )
+            ids = data.get("ids") or []
+            if not ids:
+                return
+            for row in zip(ids, data["documents"], data["metadatas"], data["embeddings"]):
+                yield row
+            offset += len(ids)
+
+    def count(self) -> int:
+        return self._collection.count()
+
+    def persist(self):
+        self.store.persist()
+
+
+class NumpyVectorIndex:
+    """
+    Exact-search index persisted as two files in `directory`:
+        vectors.npy   (N, dim) matrix, opened with mmap_mode="r" when mmap=True
+        rows.jsonl    one {"id", "text", "metadata"} per matrix row
+    Writes are buffered in memory until persist(). float16 halves memory but
+    numpy has to upcast it per query, so it is several times slower to search.
+    """
+
+    def __init__(self, directory: str, dim: int, dtype: str = "float32", mmap: bool = True):
+        self.directory = directory
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self._vec_path = os.path.join(directory, "vectors.npy")
+        self._rows_path = os.path.join(directory, "rows.jsonl")
+        self._lock = threading.RLock()
+
+        self._mat = np.zeros((0, dim), dtype=self.dtype)
+        self._n = 0
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metas: List[dict] = []
+        self._hash_rows: Dict[str, int] = {}
+        self._source_codes: Dict[str, int] = {}
+        self._sources = np.zeros(0, dtype=np.int32)
+
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self._vec_path) and os.path.exists(self._rows_path):
+            self._load(mmap)
+
+    # ---- storage ----
+    def _load(self, mmap: bool):
+        mat = np.load(self._vec_path, mmap_mode="r" if mmap else None)
+        rows = []
+        with open(self._rows_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    rows.append(json.loads(line))
+        n = min(len(rows), mat.shape[0])
+        self._mat = mat if mat.dtype == self.dtype else mat.astype(self.dtype)
+        self._n = n
+        for r in rows[:n]:
+            self._append_row(r["id"], r["text"], r["metadata"])
+        self._rebuild_sources()
+
+    def persist(self):
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_vec = self._vec_path + ".tmp.npy"
+            tmp_rows = self._rows_path + ".tmp"
+            np.save(tmp_vec, np.ascontiguousarray(self._mat[:self._n]))
+            with open(tmp_rows, "w", encoding="utf-8") as f:
+                for i in range(self._n):
+                    f.write(json.dumps({"id": self._ids[i], "text": self._texts[i], "metadata": self._metas[i]}) + "\n")
+            # drop our mapping of the old file before replacing it (Windows)
+            if isinstance(self._mat, np.memmap):
+                self._mat = np.array(self._mat[:self._n])
+            os.replace(tmp_vec, self._vec_path)
+            os.replace(tmp_rows, self._rows_path)
+
+    def _append_row(self, id_: str, text: str, meta: dict):
+        self._ids.append(id_)
+        self._texts.append(text)
+        self._metas.append(meta)
+        if meta.get("doc_hash"):
+            self._hash_rows[meta["doc_hash"]] = len(self._ids) - 1
+
+    def _source_code(self, source) -> int:
+        return self._source_codes.setdefault(source or "", len(self._source_codes))
+
+    def _rebuild_sources(self):
+        self._sources = np.array([self._source_code(m.get("source")) for m in self._metas], dtype=np.int32)
+
+    def _reserve(self, extra: int):
+        need = self._n + extra
+        if isinstance(self._mat, np.memmap) or need > self._mat.shape[0]:
+            cap = max(need, 2 * self._mat.shape[0], 1024)
+            grown = np.zeros((cap, self.dim), dtype=self.dtype)
+            grown[:self._n] = self._mat[:self._n]
+            self._mat = grown
+
+    # ---- backend API ----
+    def existing_hashes(self, hashes: Sequence[str]) -> set:
+        with self._lock:
+            return {h for h in hashes if h in self._hash_rows}
+
+    def add(self, ids: List[str], vectors: List[List[float]], texts: List[str], metadatas: List[dict]):
+        vecs = np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dim)
+        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+        vecs = vecs / np.where(norms == 0, 1, norms)
+        with self._lock:
+            self._reserve(len(ids))
+            self._mat[self._n:self._n + len(ids)] = vecs.astype(self.dtype)
+            self._n += len(ids)
+            for id_, text, meta in zip(ids, texts, metadatas):
+                self._append_row(id_, text, dict(meta))
+            codes = np.array([self._source_code(m.get("source")) for m in metadatas], dtype=np.int32)
+            self._sources = np.concatenate([self._sources, codes])
+
+    def delete_hashes(self, hashes: Sequence[str]):
+        with self._lock:
+            drop = {self._hash_rows[h] for h in hashes if h in self._hash_rows}
+            if not drop:
+                return
+            keep = np.array([i for i in range(self._n) if i not in drop], dtype=np.int64)
+            self._mat = np.array(self._mat[keep])
+            self._n = len(keep)
+            ids, texts, metas = self._ids, self._texts, self._metas
+            self._ids, self._texts, self._metas, self._hash_rows = [], [], [], {}
+            for i in keep:
+                self._append_row(ids[i], texts[i], metas[i])
+            self._rebuild_sources()
+
+    def search(self, vector: Sequence[float], k: int, source: Optional[str] = None) -> List[Tuple[str, dict]]:
+        q = np.asarray(vector, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        with self._lock:
+            n = self._n
+            if n == 0 or k <= 0:
+                return []
+            mat = self._mat[:n]
+            if mat.dtype == np.float32:
+                scores = mat @ q
+            else:
+                # numpy has no fast float16 GEMV; upcast in blocks to bound memory
+                scores = np.empty(n, dtype=np.float32)
+                for s in range(0, n, 65536):
+                    scores[s:s + 65536] = mat[s:s + 65536].astype(np.float32) @ q
+
+            if source:
+                code = self._source_codes.get(source)
+                if code is None:
+                    return []
+                scores = np.where(self._sources[:n] == code, scores, -np.inf)
+                k = min(k, int(np.count_nonzero(self._sources[:n] == code)))
+            k = min(k, n)
+            if k == 0:
+                return []
+
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self._texts[i], self._metas[i]) for i in top]
+
+    def iter_documents(self, source: Optional[str] = None, limit: Optional[int] = None,
+                       page_size: int = DOC_PAGE_SIZE) -> Iterator[Tuple[str, dict]]:
+        # rows already live in memory; page_size only matters for Chroma
+        with self._lock:
+            order = sorted(
+                (_doc_order(m, self._ids[i]), i) for i, m in enumerate(self._metas)
+                if not source or m.get("source") == source
+            )
+            if limit is not None:
+                order = order[:limit]
+            rows = [(self._texts[i], self._metas[i]) for _, i in order]
+        yield from rows
+
+    def iter_rows(self, page_size: int = 1000) -> Iterator[Tuple[str, str, dict, List[float]]]:
+        with self._lock:
+            n = self._n
+        for start in range(0, n, page_size):
+            with self._lock:
+                stop = min(start + page_size, self._n)
+                block = np.asarray(self._mat[start:stop], dtype=np.float32)
+                rows = list(zip(self._ids[start:stop], self._texts[start:stop], self._metas[start:stop]))
+            for (id_, text, meta), vec in zip(rows, block):
+                yield id_, text, meta, vec.tolist()
+
+    def count(self) -> int:
+        return self._n
+
+    def import_from(self, other, page_size: int = 1000) -> int:
+        """Copy every row of another backend (e.g. Chroma) into this index."""
+        def flush(rows):
+            ids, texts, metas, vectors = map(list, zip(*rows))
+            self.add(ids, vectors, texts, metas)
+
+        batch = []
+        for row in other.iter_rows(page_size):
+            batch.append(row)
+            if len(batch) >= page_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+        self.persist()
+        return self._n
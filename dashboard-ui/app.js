@@ -352,6 +352,27 @@ function saveQuizHistory() {
   } catch {}
 }
 
+// question texts of recent quizzes; the backend rejects paraphrases of them
+const RECENT_QUESTIONS_MAX = 50;
+
+function loadRecentQuestions() {
+  try {
+    const raw = localStorage.getItem('sb.recentQuestions');
+    return raw ? JSON.parse(raw) : [];
+  } catch {
+    return [];
+  }
+}
+
+function rememberQuestions(qs) {
+  const recent = loadRecentQuestions()
+    .concat(qs.map(q => q.question))
+    .slice(-RECENT_QUESTIONS_MAX);
+  try {
+    localStorage.setItem('sb.recentQuestions', JSON.stringify(recent));
+  } catch {}
+}
+
 function renderQuizQuestion(resultBox, statusLabel) {
   const quiz = getQuizState();
   const total = quiz.questions.length;
@@ -1199,6 +1220,7 @@ function wireAI(){
   const summarizeBtn   = $('#aiSummarizeBtn');
 
   const addPdfBtn = $('#aiAddPdfBtn');
+  const cancelIngestBtn = $('#aiCancelIngestBtn');
 
   const resultBox      = $('#aiResult');
   const statusLabel    = $('#aiStatus');
@@ -1223,10 +1245,39 @@ function wireAI(){
       answers: [],
       inProgress: false,
       finished: false,
-      report: null
+      report: null,
+      loading: false,    // progressive quiz: more questions still arriving
+      expected: 0
     };
   }
 
+  // fetch the rest of a progressive quiz in the background, one question at a time
+  async function loadRemainingQuestions(sessionId, topic) {
+    const quiz = state.ai.quiz;
+    while (state.ai.quiz === quiz && quiz.loading) {
+      const res = await window.electronAPI.ai.quizNext(sessionId, quiz.questions.length);
+      if (state.ai.quiz !== quiz) return;   // a new quiz was started meanwhile
+      const data = res?.data;
+      if (!res || !res.ok || data?.ok === false) {
+        console.error('ai:quiz:next failed', res);
+        quiz.loading = false;
+        break;
+      }
+      if (data.question) {
+        quiz.questions.push(data.question);
+        quiz.answers.push('');
+        rememberQuestions([data.question]);
+      }
+      if (data.done) quiz.loading = false;
+      // the user is waiting on what used to be the last question
+      if (!quiz.finished && quiz.currentIndex >= quiz.questions.length - 2) renderQuiz();
+    }
+    if (state.ai.quiz === quiz && !quiz.finished) {
+      setStatus(`Quiz ready: ${quiz.questions.length} questions on "${topic}".`);
+      renderQuiz();
+    }
+  }
+
   function renderQuiz() {
     const quiz = state.ai.quiz;
     const box = resultBox;
@@ -1305,7 +1356,7 @@ function wireAI(){
 
     box.innerHTML = `
       <div style="margin-bottom:8px;font-size:13px;color:var(--muted);">
-        Question ${idx+1} of ${total}
+        Question ${idx+1} of ${quiz.loading ? Math.max(quiz.expected, total) : total}
       </div>
       <div style="margin-bottom:8px;">
         ${escapeHtml(q.question || '')}
@@ -1321,7 +1372,9 @@ function wireAI(){
         <div style="margin-left:auto;display:flex;gap:8px;">
           ${idx < total-1
             ? '<button class="btn small" id="aiNextBtn">Next</button>'
-            : '<button class="btn small" id="aiSubmitBtn">Submit quiz</button>'
+            : quiz.loading
+              ? '<button class="btn small" disabled>Generating next…</button>'
+              : '<button class="btn small" id="aiSubmitBtn">Submit quiz</button>'
           }
         </div>
       </div>
@@ -1334,6 +1387,11 @@ function wireAI(){
       return input ? input.value : '';
     };
 
+    // keep the choice if a newly arrived question re-renders this one
+    form.addEventListener('change', () => {
+      quiz.answers[idx] = getSelected() || quiz.answers[idx];
+    });
+
     $('#aiPrevBtn')?.addEventListener('click', (e) => {
       e.preventDefault();
       quiz.answers[idx] = getSelected() || quiz.answers[idx];
@@ -1410,14 +1468,55 @@ function wireAI(){
     resultBox.textContent = text || '';
   };
 
+  // append the tokens of stream `streamId` to the result box; returns an unsubscribe fn.
+  // a stream the user has moved on from may still be sending, so others are ignored
+  const newStreamId = () => `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+  const startStreaming = (streamId) => {
+    resetQuiz();
+    resultBox.textContent = '';
+    return window.electronAPI.ai.onStreamToken((token) => {
+      if (token.stream_id !== streamId) return;
+      resultBox.textContent += token.text;
+    });
+  };
+
   // ----- load stored PDFs and render -----  
   loadAIPdfs();
   renderAIPdfList();
 
+  // job ids of uploads still running; the cancel button stops all of them
+  const runningIngests = new Set();
+  const updateCancelIngestBtn = () => {
+    if (cancelIngestBtn) cancelIngestBtn.style.display = runningIngests.size ? '' : 'none';
+  };
+
+  cancelIngestBtn?.addEventListener('click', async () => {
+    setStatus('Cancelling upload…');
+    for (const jobId of runningIngests) {
+      const res = await window.electronAPI.ai.cancelIngest(jobId);
+      if (!res || !res.ok || res.data?.ok === false) console.error('ai:ingest:cancel failed', res);
+    }
+  });
+
     addPdfBtn?.addEventListener('click', async () => {
     setStatus('Select a PDF to add to your notes…');
+    // tells this upload's progress events apart from those of another one
+    const requestId = `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    let jobId = null;
+    const stopProgress = window.electronAPI.ai.onIngestProgress?.((p) => {
+      if (p.request_id !== requestId) return;
+      if (p.job_id && !jobId && p.status === 'processing') {
+        jobId = p.job_id;
+        runningIngests.add(jobId);
+        updateCancelIngestBtn();
+      }
+      if (p.status !== 'processing' || !p.pages_total) return;
+      const eta = p.eta_seconds ? `, ~${Math.ceil(p.eta_seconds)}s left` : '';
+      setStatus(`Adding notes… page ${p.pages_extracted}/${p.pages_total}, ${p.chunks_embedded || 0} new chunks${eta}`);
+    });
     try {
-      const res = await window.electronAPI.ai.ingest();
+      const res = await window.electronAPI.ai.ingest(requestId);
+      stopProgress?.();
       console.log('ai:ingest result', res);
 
       if (!res || !res.ok) {
@@ -1442,8 +1541,12 @@ function wireAI(){
 
       setStatus(`Added "${name}" (${pages} pages) to your notes.`);
     } catch (err) {
+      stopProgress?.();
       console.error('ai:ingest error', err);
       showError(String(err));
+    } finally {
+      runningIngests.delete(jobId);
+      updateCancelIngestBtn();
     }
   });
 
@@ -1461,10 +1564,51 @@ function wireAI(){
 
     setStatus('Generating quiz…');
     resetQuiz();
+    const quiz = state.ai.quiz;
     resultBox.textContent = '';
 
     try {
-      const res = await window.electronAPI.ai.quiz(topic, difficulty, n);
+      if (window.electronAPI.ai.quizStart) {
+        // progressive: show the first question now, fetch the rest while it is answered
+        const res = await window.electronAPI.ai.quizStart(topic, difficulty, n, loadRecentQuestions());
+        console.log('ai:quiz:start result', res);
+        if (!res || !res.ok || res.data?.ok === false) {
+          showError(res?.error || res?.data?.error || 'Quiz failed.');
+          return;
+        }
+
+        // the server stops waiting after a while (e.g. during a rate-limit pause); keep asking
+        let data = res.data;
+        while (data.pending) {
+          const next = await window.electronAPI.ai.quizNext(res.data.session_id, 0);
+          if (state.ai.quiz !== quiz) return;   // a new quiz was started meanwhile
+          if (!next || !next.ok || next.data?.ok === false) {
+            showError(next?.error || next?.data?.error || 'Quiz failed.');
+            return;
+          }
+          data = next.data;
+        }
+        if (!data.question) {
+          showError(data.error || 'No questions generated. Try another topic or difficulty.');
+          return;
+        }
+
+        const first = data.question;
+        state.ai.quiz.questions = [first];
+        rememberQuestions([first]);
+        state.ai.quiz.currentIndex = 0;
+        state.ai.quiz.answers = [''];
+        state.ai.quiz.inProgress = true;
+        state.ai.quiz.loading = !data.done;
+        state.ai.quiz.expected = data.total || n;
+
+        setStatus(`Quiz started on "${topic}", more questions on the way…`);
+        renderQuiz();
+        loadRemainingQuestions(res.data.session_id, topic);
+        return;
+      }
+
+      const res = await window.electronAPI.ai.quiz(topic, difficulty, n, loadRecentQuestions());
       console.log('ai:quiz result', res);
       if (!res || !res.ok || res.data?.ok === false) {
         showError(res?.error || res?.data?.error || 'Quiz failed.');
@@ -1478,6 +1622,7 @@ function wireAI(){
       }
 
       state.ai.quiz.questions = qs;
+      rememberQuestions(qs);
       state.ai.quiz.currentIndex = 0;
       state.ai.quiz.answers = new Array(qs.length).fill('');
       state.ai.quiz.inProgress = true;
@@ -1503,22 +1648,26 @@ function wireAI(){
     setStatus('Thinking…');
     resultBox.textContent = '';
 
+    const ai = window.electronAPI.ai;
+    const streamId = newStreamId();
+    const stopTokens = ai.doubtStream ? startStreaming(streamId) : null;
     try {
-      const res = await window.electronAPI.ai.doubt(
-        question,
-        state.ai.lastAnswer || ''
-      );
+      const res = ai.doubtStream
+        ? await ai.doubtStream(question, state.ai.lastAnswer || '', streamId)
+        : await ai.doubt(question, state.ai.lastAnswer || '');
+      stopTokens?.();
       console.log('ai:doubt result', res);
       if (!res || !res.ok || res.data?.ok === false) {
         showError(res?.error || res?.data?.error || 'Doubt solver failed.');
         return;
       }
 
-      const ans = res.data.answer || '';
+      const ans = res.text ?? res.data.answer ?? '';
       showPlainResult(ans);
       state.ai.lastAnswer = ans;
       setStatus('Answer ready. You can ask a follow-up like "explain better".');
     } catch (err) {
+      stopTokens?.();
       console.error('ai:doubt error', err);
       showError(String(err));
     }
@@ -1543,18 +1692,24 @@ function wireAI(){
     setStatus('Summarizing your notes (this can take a bit)…');
     resultBox.textContent = '';
 
+    const ai = window.electronAPI.ai;
+    const streamId = newStreamId();
+    const stopTokens = ai.summarizeStream ? startStreaming(streamId) : null;
     try {
-      // IMPORTANT: preload/main must be updated to accept (mode, sourcePath)
-      const res = await window.electronAPI.ai.summarize(mode, sourcePath);
+      const res = ai.summarizeStream
+        ? await ai.summarizeStream(mode, sourcePath, streamId)
+        : await ai.summarize(mode, sourcePath);
+      stopTokens?.();
       console.log('ai:summarize result', res);
       if (!res || !res.ok ) {
         showError(res?.error || res?.data?.error || 'Summary failed.');
         return;
       }
 
-      showPlainResult(res.summary || '');
+      showPlainResult(res.text ?? res.summary ?? '');
       setStatus(`Summary ready (${mode}).`);
     } catch (err) {
+      stopTokens?.();
       console.error('ai:summarize error', err);
       showError(String(err));
     }
@@ -345,12 +345,13 @@ async function postToAI(path, body) {
   return res.data;
 }
 
-ipcMain.handle('ai:quiz', async (_evt, { topic, difficulty, numQuestions }) => {
+ipcMain.handle('ai:quiz', async (_evt, { topic, difficulty, numQuestions, recentQuestions }) => {
   try {
     const data = await postToAI('/quiz', {
       topic,
       difficulty,
       num_questions: numQuestions ?? 5,
+      recent_questions: recentQuestions || [],
     });
     return { ok: true, data };
   } catch (err) {
@@ -359,6 +360,33 @@ ipcMain.handle('ai:quiz', async (_evt, { topic, difficulty, numQuestions }) => {
   }
 });
 
+// progressive quiz: the first question comes back as soon as it exists,
+// the rest are fetched one by one with ai:quiz:next
+ipcMain.handle('ai:quiz:start', async (_evt, { topic, difficulty, numQuestions, recentQuestions }) => {
+  try {
+    const data = await postToAI('/quiz/session', {
+      topic,
+      difficulty,
+      num_questions: numQuestions ?? 5,
+      recent_questions: recentQuestions || [],
+    });
+    return { ok: true, data };
+  } catch (err) {
+    console.error('ai:quiz:start error', err);
+    return { ok: false, error: String(err.message || err) };
+  }
+});
+
+ipcMain.handle('ai:quiz:next', async (_evt, { sessionId, index }) => {
+  try {
+    const res = await axios.get(`${AI_BASE_URL}/quiz/session/${sessionId}/${index}`, { timeout: 180000 });
+    return { ok: true, data: res.data };
+  } catch (err) {
+    console.error('ai:quiz:next error', err);
+    return { ok: false, error: String(err.message || err) };
+  }
+});
+
 ipcMain.handle('ai:doubt', async (_evt, { question, lastAnswer }) => {
   try {
     const data = await postToAI('/doubt', { question, last_answer: lastAnswer || '' });
@@ -405,8 +433,76 @@ ipcMain.handle('ai:summarize', async (_evt, { mode, source  }) => {
   }
 });
 
+// POST to an SSE endpoint; forwards every token to the renderer (tagged with
+// the renderer's stream id, so an older stream's tokens can be told apart)
+// and resolves with the full text once the backend sends "done".
+async function streamFromAI(path, body, sender, streamId) {
+  const res = await axios.post(`${AI_BASE_URL}${path}`, body, {
+    responseType: 'stream',
+    timeout: 0,
+  });
+
+  return new Promise((resolve) => {
+    let buffer = '';
+    let settled = false;
+    const finish = (result) => {
+      if (!settled) {
+        settled = true;
+        resolve(result);
+      }
+    };
+
+    res.data.on('data', (chunk) => {
+      buffer += chunk.toString('utf8');
+      let sep;
+      while ((sep = buffer.indexOf('\n\n')) >= 0) {
+        const raw = buffer.slice(0, sep);
+        buffer = buffer.slice(sep + 2);
+        const event = (raw.match(/^event: (.*)$/m) || [])[1];
+        const dataLine = (raw.match(/^data: (.*)$/m) || [])[1];
+        let payload;
+        try {
+          payload = dataLine ? JSON.parse(dataLine) : {};
+        } catch (err) {
+          console.error('[MAIN] bad stream event', raw);
+          finish({ ok: false, error: 'Malformed stream event' });
+          res.data.destroy();
+          return;
+        }
+
+        if (event === 'token') sender.send('ai:stream:token', { stream_id: streamId, text: payload.text });
+        else if (event === 'done') finish({ ok: true, text: payload.text });
+        else if (event === 'error') finish({ ok: false, error: payload.error });
+      }
+    });
+    res.data.on('end', () => finish({ ok: false, error: 'Stream ended early' }));
+    res.data.on('error', (err) => finish({ ok: false, error: String(err.message || err) }));
+  });
+}
+
+ipcMain.handle('ai:doubt:stream', async (evt, { question, lastAnswer, streamId }) => {
+  try {
+    return await streamFromAI('/doubt/stream', { question, last_answer: lastAnswer || '' }, evt.sender, streamId);
+  } catch (err) {
+    console.error('ai:doubt:stream error', err);
+    return { ok: false, error: String(err.message || err) };
+  }
+});
 
-ipcMain.handle('ai:ingest', async () => {
+ipcMain.handle('ai:summarize:stream', async (evt, { mode, source, streamId }) => {
+  try {
+    return await streamFromAI('/summarize/stream', { mode: mode || 'Detailed', source: source || null },
+                              evt.sender, streamId);
+  } catch (err) {
+    console.error('[MAIN] ai:summarize:stream error', err);
+    return { ok: false, error: String(err.message || err) };
+  }
+});
+
+
+// each upload keeps its own job id; progress events carry it (and the renderer's
+// request id) so the window can tell uploads apart and cancel the right one
+ipcMain.handle('ai:ingest', async (evt, { requestId } = {}) => {
   try {
     const res = await dialog.showOpenDialog({
       title: 'Select PDF notes',
@@ -420,14 +516,56 @@ ipcMain.handle('ai:ingest', async () => {
 
     const pdfPath = res.filePaths[0];
 
-    const data = await postToAI('/ingest', { path: pdfPath });
+    // Step 1: Start the ingest job
+    const startRes = await postToAI('/ingest/start', { path: pdfPath });
+    if (!startRes.ok) {
+      return { ok: false, error: startRes.error || 'Ingest failed to start' };
+    }
+    const jobId = startRes.job_id;
+
+    console.log('[MAIN] Ingest started, Job ID:', jobId);
 
-    return { ok: true, data };
+    // Step 2: Poll, forwarding progress to the window that asked
+    while (true) {
+      const statusRes = await axios.get(`${AI_BASE_URL}/ingest/status/${jobId}`);
+      const statusData = statusRes.data;
+
+      if (!evt.sender.isDestroyed()) {
+        evt.sender.send('ai:ingest:progress', { ...statusData, job_id: jobId, request_id: requestId });
+      }
+
+      if (statusData.status === 'done') {
+        console.log('[MAIN] Ingest complete');
+        return { ok: true, data: { ok: true, pages: statusData.pages, path: pdfPath, job_id: jobId } };
+      }
+
+      if (statusData.status === 'cancelled') {
+        return { ok: false, error: 'cancelled' };
+      }
+
+      if (statusData.status === 'error') {
+        console.error('[MAIN] Ingest failed:', statusData.error);
+        return { ok: false, error: statusData.error };
+      }
+
+      await new Promise(resolve => setTimeout(resolve, 1000));
+    }
   } catch (err) {
     console.error('[MAIN] ai:ingest error', err);
     return { ok: false, error: String(err.message || err) };
   }
 });
+
+ipcMain.handle('ai:ingest:cancel', async (_evt, { jobId } = {}) => {
+  if (!jobId) return { ok: false, error: 'No ingest running' };
+  try {
+    const data = await postToAI(`/ingest/cancel/${jobId}`, {});
+    return { ok: true, data };
+  } catch (err) {
+    console.error('[MAIN] ai:ingest:cancel error', err);
+    return { ok: false, error: String(err.message || err) };
+  }
+});
 ipcMain.handle('ai:attentive', async () => {
   try {
     const data = await postToAI('/attentive', {}); // FastAPI endpoint
@@ -19,14 +19,34 @@ contextBridge.exposeInMainWorld('electronAPI', {
   },
 
   ai: {
-  quiz:      (topic, difficulty, numQuestions) =>
-    ipcRenderer.invoke('ai:quiz', { topic, difficulty, numQuestions }),
+  quiz:      (topic, difficulty, numQuestions, recentQuestions) =>
+    ipcRenderer.invoke('ai:quiz', { topic, difficulty, numQuestions, recentQuestions }),
+  quizStart: (topic, difficulty, numQuestions, recentQuestions) =>
+    ipcRenderer.invoke('ai:quiz:start', { topic, difficulty, numQuestions, recentQuestions }),
+  quizNext:  (sessionId, index) =>
+    ipcRenderer.invoke('ai:quiz:next', { sessionId, index }),
   doubt:     (question, lastAnswer) =>
     ipcRenderer.invoke('ai:doubt', { question, lastAnswer }),
-  summarize: (mode) =>
+  summarize: (mode, source) =>
     ipcRenderer.invoke('ai:summarize', { mode, source  }),
-  ingest: () =>
-    ipcRenderer.invoke('ai:ingest'),
+  doubtStream: (question, lastAnswer, streamId) =>
+    ipcRenderer.invoke('ai:doubt:stream', { question, lastAnswer, streamId }),
+  summarizeStream: (mode, source, streamId) =>
+    ipcRenderer.invoke('ai:summarize:stream', { mode, source, streamId }),
+  onStreamToken: (cb) => {
+    const listener = (_evt, token) => cb(token);
+    ipcRenderer.on('ai:stream:token', listener);
+    return () => ipcRenderer.removeListener('ai:stream:token', listener);
+  },
+  ingest: (requestId) =>
+    ipcRenderer.invoke('ai:ingest', { requestId }),
+  cancelIngest: (jobId) =>
+    ipcRenderer.invoke('ai:ingest:cancel', { jobId }),
+  onIngestProgress: (cb) => {
+    const listener = (_evt, status) => cb(status);
+    ipcRenderer.on('ai:ingest:progress', listener);
+    return () => ipcRenderer.removeListener('ai:ingest:progress', listener);
+  },
   attentive: () =>
     ipcRenderer.invoke('ai:attentive'),
   analytics: (payload) =>